@@ -50,37 +50,31 @@ class AccountViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         logger.info('Starting create a account')
         response = super().create(request, *args, **kwargs)
-        logger.info('Response create a account with user id: {} status code: {} response keys: {}'.format(
-            response.data['id'], response.status_code, list(response.data.keys()))
-        )
+        logger.info('Response create a account with user id: %s status code: %s response keys: %s',
+                    response.data['id'], response.status_code, list(response.data.keys()))
         return response
 
     def retrieve(self, request, *args, **kwargs):
-        logger.info('Starting retrieve a account from user id: {}'.format(request.user.id))
+        logger.info('Starting retrieve a account from user id: %s', request.user.id)
         response = super().retrieve(request, *args, **kwargs)
-        logger.info('Response retrieve a account from user id: {} with status code: {} response keys: {}'.format(
-            response.data['id'], response.status_code, list(response.data.keys()))
-        )
+        logger.info('Response retrieve a account from user id: %s with status code: %s response keys: %s',
+                    response.data['id'], response.status_code, list(response.data.keys()))
         return response
 
     def update(self, request, *args, **kwargs):
         action = 'partial update' if kwargs.get('partial', False) else 'update'
-        logger.info('Starting {} a account from user id: {} with payload keys: {}'.format(
-            action, request.user.id, list(request.data.keys())
-        ))
+        logger.info('Starting %s a account from user id: %s with payload keys: %s',
+                    action, request.user.id, list(request.data.keys()))
         response = super().update(request, *args, **kwargs)
-        logger.info('Response {} a account from user id: {} with status code: {} response keys: {}'.format(
-            action, response.data['id'], response.status_code, list(response.data.keys())
-        ))
+        logger.info('Response %s a account from user id: %s with status code: %s response keys: %s',
+                    action, response.data['id'], response.status_code, list(response.data.keys()))
         return response
 
     def destroy(self, request, *args, **kwargs):
         user_id = request.user.id
-        logger.info('Starting destroy a account from user id: {}'.format(user_id))
+        logger.info('Starting destroy a account from user id: %s', user_id)
         response = super().destroy(request, *args, **kwargs)
-        logger.info('Response destroy a account from user id: {} with status code: {}'.format(
-            user_id, response.status_code
-        ))
+        logger.info('Response destroy a account from user id: %s with status code: %s', user_id, response.status_code)
         return response
 
     def get_serializer_class(self):
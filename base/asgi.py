@@ -0,0 +1,151 @@
+"""
+An ASGI fast path which serves the cached responses of the safe actions from
+the event loop, without taking a thread of the pool.
+
+Django 3.0 runs every view in a thread, even under ASGI. The views with the
+`CachedResponseMixin` mark their requests, and the `RenderedResponseMiddleware`
+stores the rendered response of the marked ASGI requests. The next requests
+with the same scheme, host, URL, `Accept`, `Accept-Language` and language cookie are sent
+from the cache while the cache versions of the models are unchanged, the
+other requests and the misses go to the Django application.
+
+eg: `application = FastPathApplication(get_asgi_application())`
+"""
+import logging
+import time
+import uuid
+from http.cookies import SimpleCookie
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from .cache import get_model_versions, make_key, metrics
+
+logger = logging.getLogger('base.requests')
+
+# The headers of the stored response which are not sent from the cache.
+SKIPPED_HEADERS = {'x-cache', 'age', 'x-request-id', 'set-cookie'}
+
+
+def get_header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin1')
+    return ''
+
+
+def get_origin(scope):
+    """
+    Return the scheme and the host of an ASGI request scope, read like `HttpRequest` does for the absolute URLs.
+    """
+    scheme = scope.get('scheme', 'http')
+    if settings.SECURE_PROXY_SSL_HEADER:
+        header, value = settings.SECURE_PROXY_SSL_HEADER
+        name = header[len('HTTP_'):].replace('_', '-').lower().encode('latin1')
+        if header.startswith('HTTP_') and get_header(scope, name) == value:
+            scheme = 'https'
+
+    host = get_header(scope, b'x-forwarded-host') if settings.USE_X_FORWARDED_HOST else ''
+    host = host or get_header(scope, b'host')
+    if not host and scope.get('server'):
+        host = '%s:%s' % tuple(scope['server'])
+    return scheme, host
+
+
+def get_rendered_key(scope):
+    """
+    Make the cache key of the rendered response of an ASGI request scope.
+    """
+    cookie = SimpleCookie()
+    cookie.load(get_header(scope, b'cookie'))
+    language = cookie.get(settings.LANGUAGE_COOKIE_NAME)
+    return make_key(
+        'rendered',
+        *get_origin(scope),
+        scope['path'],
+        scope.get('query_string', b''),
+        get_header(scope, b'accept'),
+        get_header(scope, b'accept-language'),
+        language.value if language is not None else '',
+    )
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Weak comparison of the ETag with the ones of the `If-None-Match` header.
+    """
+    etag = etag.replace('W/', '', 1)
+    return any(value == '*' or value.replace('W/', '', 1) == etag for value in parse_etags(if_none_match))
+
+
+def store_rendered_response(request, response, name, models, versions, timeout):
+    """
+    Store the rendered response of an ASGI request for the fast path.
+
+    :param `name` is the name of the view action for the cache metrics.
+    :param `models` is the list of class models which versions are checked on each hit.
+    :param `versions` is the cache versions of the models when the response data was read.
+    """
+    cache.set(get_rendered_key(request.scope), {
+        'status': response.status_code,
+        'headers': [(name, value) for name, value in response.items() if name.lower() not in SKIPPED_HEADERS],
+        'content': response.content,
+        'name': name,
+        'models': [model._meta.label for model in models],
+        'versions': versions,
+        'created': time.time(),
+    }, timeout)
+
+
+class FastPathApplication:
+    """
+    Send the stored rendered response of the GET requests from the event loop.
+
+    The cache backend is called from the event loop, so it should answer in
+    a fraction of millisecond, like the local memory or a nearby memcached.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            start = time.monotonic()
+            entry = self.get_entry(scope)
+            if entry is not None:
+                return await self.send_entry(entry, scope, send, start)
+        return await self.application(scope, receive, send)
+
+    def get_entry(self, scope):
+        entry = cache.get(get_rendered_key(scope))
+        if entry is None:
+            return None
+        models = [apps.get_model(label) for label in entry['models']]
+        if get_model_versions(*models) != entry['versions']:
+            return None
+        return entry
+
+    async def send_entry(self, entry, scope, send, start):
+        request_id = get_header(scope, b'x-request-id') or uuid.uuid4().hex
+        age = time.time() - entry['created']
+        metrics.hit(entry['name'], age)
+
+        status, content = entry['status'], entry['content']
+        headers = dict((name.lower(), value) for name, value in entry['headers'])
+        if_none_match = get_header(scope, b'if-none-match')
+        if if_none_match and 'etag' in headers and etag_matches(headers['etag'], if_none_match):
+            status, content = 304, b''
+
+        response_headers = [
+            (name.encode('ascii'), value.encode('latin1')) for name, value in entry['headers']
+            if status == 200 or name.lower() in ('etag', 'last-modified', 'vary')
+        ]
+        response_headers += [
+            (b'X-Cache', b'HIT'), (b'Age', str(int(age)).encode('ascii')),
+            (b'X-Request-ID', request_id.encode('latin1')),
+        ]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+        logger.info('%s %s %s %s %.1fms %d queries', request_id, scope['method'], scope['path'], status,
+                    (time.monotonic() - start) * 1000, 0)
@@ -0,0 +1,281 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+def get_version_key(model):
+    return 'version:{}'.format(model._meta.label_lower)
+
+
+def get_written_key(model):
+    return 'written:{}'.format(model._meta.label_lower)
+
+
+def get_versions(*keys):
+    """
+    Get the current version of each key.
+
+    A missing version is started from the current time, so a version evicted
+    from the cache never goes back to a value used before.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_versions(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+
+def get_model_versions(*models):
+    """
+    Get the current cache version of each model, see `get_versions`.
+
+    :param `models` is the list of class models.
+    """
+    return get_versions(*[get_version_key(model) for model in models])
+
+
+def bump_model_version(*models):
+    """
+    Bump the cache version of each model, invalidating every cache entry built with it.
+
+    :param `models` is the list of class models.
+    """
+    bump_versions(*[get_version_key(model) for model in models])
+    mark_written(*models)
+
+
+def mark_written(*models):
+    """
+    Flag the models as written for `REPLICA_STICKY_SECONDS`, see `has_recent_writes`.
+    """
+    window = getattr(settings, 'REPLICA_STICKY_SECONDS', 0)
+    if window and getattr(settings, 'REPLICA_DATABASES', None):
+        cache.set_many({get_written_key(model): True for model in models}, window)
+
+
+def has_recent_writes(*models):
+    """
+    Check if any of the models was written in the last `REPLICA_STICKY_SECONDS`,
+    its reads should go to the primary until the replicas catch up.
+
+    :param `models` is the list of class models.
+    """
+    return bool(cache.get_many([get_written_key(model) for model in models]))
+
+
+def make_digest(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def make_key(prefix, *parts):
+    """
+    Make a cache key from the prefix and a digest of the parts.
+    eg: `count:5d41402abc4b2a76b9719d911017c592`
+    """
+    return '{}:{}'.format(prefix, make_digest(*parts))
+
+
+class CacheMetrics:
+    """
+    The hit ratio and the staleness of the cached responses served by this worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def _get(self, name):
+        return self.stats.setdefault(name, {'hits': 0, 'misses': 0, 'age_total': 0.0, 'age_max': 0.0})
+
+    def hit(self, name, age):
+        with self.lock:
+            stats = self._get(name)
+            stats['hits'] += 1
+            stats['age_total'] += age
+            stats['age_max'] = max(stats['age_max'], age)
+
+    def miss(self, name):
+        with self.lock:
+            self._get(name)['misses'] += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                name: {
+                    'hits': stats['hits'],
+                    'misses': stats['misses'],
+                    'hit_ratio': stats['hits'] / ((stats['hits'] + stats['misses']) or 1),
+                    'age_avg': stats['age_total'] / (stats['hits'] or 1),
+                    'age_max': stats['age_max'],
+                } for name, stats in self.stats.items()
+            }
+
+
+metrics = CacheMetrics()
+
+
+tables = {}
+
+
+def get_max_age(max_age=None):
+    """
+    Return the seconds a per-worker copy is kept, by default the `LOCAL_CACHE_MAX_AGE` setting.
+    """
+    return getattr(settings, 'LOCAL_CACHE_MAX_AGE', 60) if max_age is None else max_age
+
+
+def get_table(model):
+    """
+    Return the `LocalTable` of the class model or `None`.
+    """
+    return tables.get(model)
+
+
+class LocalTable:
+    """
+    A per-worker copy of the `fields` of a small and rarely changing table, in the ordering of the model.
+
+    The copy is reloaded from the primary, in one query, when the `table:` version of the
+    model in the shared cache changes, bumped by `invalidate` from the signals of the model
+    on any worker. Rows written without the signals, eg: by `bulk_create`, need an explicit
+    `invalidate`. The copy is also reloaded after `max_age` seconds, for the caches which are
+    not shared between the workers, like the `LocMemCache`.
+
+    eg: `LocalTable(Category, fields=('id', 'title', 'slug')).get_rows()`
+    """
+
+    def __init__(self, model, fields, max_age=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.pk = model._meta.pk.attname
+        self.key = 'table:{}'.format(model._meta.label_lower)
+        self.max_age = get_max_age(max_age)
+        self.lock = threading.Lock()
+        self.loaded = (None, {}, {})
+        self.loaded_at = 0
+        tables[model] = self
+
+    def is_current(self, version):
+        return version == self.loaded[0] and time.monotonic() - self.loaded_at < self.max_age
+
+    def load(self):
+        """
+        Return a tuple with the version, the rows by primary key and the position of each primary key.
+        """
+        version = get_versions(self.key)[0]
+        if not self.is_current(version):
+            with self.lock:
+                if not self.is_current(version):
+                    loaded_at = time.monotonic()
+                    queryset = self.model._default_manager.db_manager(DEFAULT_DB_ALIAS).order_by(
+                        *self.model._meta.ordering
+                    ).values(*self.fields)
+                    rows = {row[self.pk]: row for row in queryset}
+                    self.loaded = (version, rows, {pk: position for position, pk in enumerate(rows)})
+                    self.loaded_at = loaded_at
+        return self.loaded
+
+    def get_rows(self):
+        """
+        Return a dict of the rows by primary key, the rows must not be changed.
+        """
+        return self.load()[1]
+
+    def get_instance(self, pk, rows=None):
+        """
+        Return an instance of the model with the `fields` of the row, or `None` when there is no row.
+        """
+        row = (self.get_rows() if rows is None else rows).get(pk)
+        if row is None:
+            return None
+        return self.model.from_db(DEFAULT_DB_ALIAS, self.fields, [row[field] for field in self.fields])
+
+    def get_related(self, through, source, target, ids, using=None):
+        """
+        Return the rows linked to each of the given ids by the through table of a many to many
+        relation, with one query on the through table only.
+
+        `None` is returned when a linked row is missing from the copy, which is not current yet.
+        """
+        _, rows, positions = self.load()
+        links = through._default_manager.db_manager(using).filter(
+            **{'{}__in'.format(source): ids}
+        ).values_list(source, target)
+
+        related = defaultdict(list)
+        for source_id, target_id in sorted(links, key=lambda link: positions.get(link[1], -1)):
+            if target_id not in rows:
+                return None
+            related[source_id].append(rows[target_id])
+        return related
+
+    def invalidate(self, using=None):
+        bump_versions(self.key)
+        # Bump again once committed, another worker may have reloaded the rows before the commit.
+        transaction.on_commit(partial(bump_versions, self.key), using=using)
+
+
+class SlugResolver:
+    """
+    A per-worker map of slug to primary key of a model, filled by the lookups and cleared like the `LocalTable`.
+
+    eg: `SlugResolver(Product).resolve('red-runner')`
+    """
+
+    def __init__(self, model, field='slug', maxsize=10000, max_age=None):
+        self.model = model
+        self.field = field
+        self.maxsize = maxsize
+        self.key = 'slugs:{}'.format(model._meta.label_lower)
+        self.max_age = get_max_age(max_age)
+        self.lock = threading.Lock()
+        self.version = None
+        self.cleared_at = 0
+        self.pks = {}
+
+    def resolve(self, slug):
+        """
+        Return the primary key of the row with the slug, or `None` when there is no row.
+        """
+        version = get_versions(self.key)[0]
+        with self.lock:
+            now = time.monotonic()
+            if version != self.version or now - self.cleared_at >= self.max_age:
+                self.version, self.pks, self.cleared_at = version, {}, now
+            pk = self.pks.get(slug)
+        if pk is not None:
+            return pk
+
+        queryset = self.model._default_manager.filter(**{self.field: slug}).order_by().values_list('pk', flat=True)
+        pk = next(iter(queryset[:1]), None)
+        if pk is not None:
+            with self.lock:
+                if version == self.version:
+                    if len(self.pks) >= self.maxsize:
+                        # The oldest slug is dropped.
+                        del self.pks[next(iter(self.pks))]
+                    self.pks[slug] = pk
+        return pk
+
+    def invalidate(self, using=None):
+        bump_versions(self.key)
+        # Bump again once committed, like `LocalTable.invalidate`.
+        transaction.on_commit(partial(bump_versions, self.key), using=using)
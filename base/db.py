@@ -0,0 +1,126 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('base.db')
+
+# The replica read of the current request, set by `read_from`.
+replica_read = ContextVar('replica_read', default=None)
+
+# The cookie set after a write, see `base.middleware.ReplicaStickinessMiddleware`.
+STICKY_COOKIE = 'db_primary'
+
+
+class QueryCounter:
+    """
+    Count the queries executed on the database connections while active.
+
+    Usage:
+        with QueryCounter() as counter:
+            ...
+        counter.count
+    """
+
+    def __init__(self, using=None):
+        self.using = [using] if using else list(connections)
+        self.count = 0
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        for alias in self.using:
+            wrapper = connections[alias].execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(exc_type, exc_value, traceback)
+
+
+@contextmanager
+def read_from(alias, models):
+    """
+    Route the reads of the models to the replica alias while active.
+
+    The reads go back to the primary after the first write, so a request
+    always reads its own writes.
+
+    :param `alias` is the alias of the replica database.
+    :param `models` is the list of class models read from the replica.
+    """
+    token = replica_read.set({
+        'alias': alias,
+        'models': {model._meta.label_lower for model in models},
+        'wrote': False,
+    })
+    try:
+        yield
+    finally:
+        replica_read.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send the reads made inside `read_from` to the replica, everything else to the primary.
+
+    The replicas are listed by the `REPLICA_DATABASES` setting and are never migrated,
+    their schema comes from the replication of the primary.
+    """
+
+    def get_label(self, model):
+        # The auto created through tables of the many to many fields follow their model.
+        return (model._meta.auto_created or model)._meta.label_lower
+
+    def db_for_read(self, model, **hints):
+        read = replica_read.get()
+        if read is None or read['wrote'] or self.get_label(model) not in read['models']:
+            return None
+        return read['alias']
+
+    def db_for_write(self, model, **hints):
+        read = replica_read.get()
+        if read is not None:
+            read['wrote'] = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas have the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaPool:
+    """
+    Choose a random healthy replica of the `REPLICA_DATABASES` setting.
+
+    A replica which failed is skipped for `REPLICA_COOLDOWN_SECONDS`, the reads
+    go to the primary when every replica is down.
+    """
+
+    def __init__(self):
+        self.failed = {}
+
+    def choose(self):
+        now = time.monotonic()
+        aliases = [alias for alias in settings.REPLICA_DATABASES if self.failed.get(alias, 0) <= now]
+        return random.choice(aliases) if aliases else None
+
+    def mark_failed(self, alias, exc=None):
+        logger.warning('Replica %s failed, reading from the primary: %s', alias, exc)
+        self.failed[alias] = time.monotonic() + settings.REPLICA_COOLDOWN_SECONDS
+
+
+replicas = ReplicaPool()
@@ -1,18 +1,90 @@
+import re
+from functools import reduce
+from operator import or_
+from django.db import router
+from django.db.models import Q
 from django.utils.text import slugify
 
 
+def get_taken_slugs(model, origins, batch_size=250):
+    """
+    Get the existing slugs equal to an origin or with its `origin-N` suffix, with one query
+    per `batch_size` origins, small enough for the expression depth limit of SQLite.
+
+    :param `model` is a class model.
+    :param `origins` is the list of slugified values.
+    """
+    origins = sorted(set(origins))
+    taken = set()
+    for index in range(0, len(origins), batch_size):
+        condition = reduce(or_, [
+            Q(slug__regex=r'^%s(-[0-9]+)?$' % re.escape(origin)) for origin in origins[index:index + batch_size]
+        ])
+        taken.update(model._default_manager.filter(condition).values_list('slug', flat=True))
+    return taken
+
+
+def is_reserved_slug(model, slug):
+    """
+    Return whether the slug is one of the `reserved_slugs` of the model, or only digits, routed as a pk.
+    """
+    return slug.isdigit() or slug in getattr(model, 'reserved_slugs', ())
+
+
 def generate_unique_slug(model, value):
     """
-    Generate unique slug if origin slug is exist.
+    Generate unique slug if origin slug is exist, with one query.
     eg: `foo-bar` => `foo-bar-1`
 
     :param `model` is a class model.
     :param `value` is specific value for slugify.
     """
-    origin = slugify(value)
-    unique = origin
-    numb = 1
-    while model.objects.filter(slug=unique).exists():
-        unique = '%s-%d' % (origin, numb)
-        numb += 1
-    return unique
+    return generate_unique_slugs(model, [value])[0]
+
+
+def generate_unique_slugs(model, values, reserved=(), batch_size=250):
+    """
+    Generate unique slug for each value of a batch, with one query per `batch_size` distinct slugs.
+    eg: `['Foo bar', 'Foo bar']` => `['foo-bar-1', 'foo-bar-2']` if `foo-bar` is exist.
+
+    :param `model` is a class model.
+    :param `values` is the list of values for slugify.
+    :param `reserved` is the slugs already used by the batch, with the reserved slugs of the model.
+    """
+    origins = [slugify(value) for value in values]
+    taken = get_taken_slugs(model, origins, batch_size=batch_size) | set(reserved)
+
+    slugs = []
+    numbs = {}
+    for origin in origins:
+        unique = origin
+        numb = numbs.get(origin, 1)
+        while unique in taken or is_reserved_slug(model, unique):
+            unique = '%s-%d' % (origin, numb)
+            numb += 1
+        numbs[origin] = numb
+        taken.add(unique)
+        slugs.append(unique)
+    return slugs
+
+
+def set_related(manager, objs):
+    """
+    Set the objects of a many to many relation like `manager.set(objs)`, reading the current
+    links from the through table only.
+
+    :param `manager` is the many to many manager of an instance, eg: `product.categories`.
+    :param `objs` is the list of instances or primary keys.
+    """
+    using = router.db_for_write(manager.through, instance=manager.instance)
+    links = manager.through._default_manager.using(using).filter(
+        **{manager.source_field_name: manager.related_val[0]}
+    )
+    current = set(links.values_list(manager.target_field_name, flat=True))
+    ids = {getattr(obj, 'pk', obj) for obj in objs}
+
+    if current - ids:
+        manager.remove(*(current - ids))
+    added = [obj for obj in objs if getattr(obj, 'pk', obj) not in current]
+    if added:
+        manager.add(*added)
@@ -0,0 +1,59 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class BackgroundFileHandler(QueueHandler):
+    """
+    A file handler which puts the records on a queue, written to the file by a
+    `QueueListener` from a background thread so the request never waits on the disk.
+
+    The records are formatted by the background thread, so the arguments of a
+    log call must not be changed after it. The listener is started on the first
+    record of each process and stopped, flushing the queue, when the logging
+    shuts down. The records are dropped when the queue is full.
+
+    eg: `{'()': 'base.logging.BackgroundFileHandler', 'filename': 'django.log', 'formatter': 'simple'}`
+    """
+
+    def __init__(self, filename, maxsize=10000, encoding=None):
+        super().__init__(queue.Queue(maxsize))
+        self.handler = logging.FileHandler(filename, encoding=encoding, delay=True)
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.handler.setFormatter(fmt)
+
+    def start(self):
+        # A forked worker does not inherit the thread of the listener.
+        self.pid = os.getpid()
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = QueueListener(self.queue, self.handler)
+        self.listener.start()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.start()
+        super().emit(record)
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.handler.close()
+        super().close()
@@ -0,0 +1,142 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class ThreadSampler:
+    """
+    Sample the peak number of threads of the process while the benchmark runs.
+    """
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.running = False
+        self.thread.join()
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput and the latency of the WSGI and the ASGI applications '
+            'serving a catalog URL at high concurrency, in process and on the current database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/catalog/products',
+            type=str,
+            help='The path requested, with the query string',
+        )
+
+        parser.add_argument(
+            '--requests',
+            default=2000,
+            type=int,
+            help='The number of requests of each application',
+        )
+
+        parser.add_argument(
+            '--concurrency',
+            default=200,
+            type=int,
+            help='The number of concurrent clients',
+        )
+
+        parser.add_argument(
+            '--client_delay',
+            default=0.05,
+            type=float,
+            help='The seconds a slow client takes to read each response',
+        )
+
+    def handle(self, *args, **options):
+        from core.asgi import application as asgi_application
+        from core.wsgi import application as wsgi_application
+
+        path, _, query_string = options['path'].partition('?')
+        for name, run in (('WSGI', self.run_wsgi), ('ASGI', self.run_asgi)):
+            application = wsgi_application if name == 'WSGI' else asgi_application
+            # The first request fills the caches of both applications.
+            run(application, path, query_string, 1, 1, 0)
+            start = time.monotonic()
+            with ThreadSampler() as sampler:
+                latencies = run(application, path, query_string, options['requests'], options['concurrency'],
+                                options['client_delay'])
+            elapsed = time.monotonic() - start
+
+            self.stdout.write('{} {}'.format(
+                self.style.SUCCESS('{}:'.format(name)),
+                self.style.WARNING('{:.0f} req/s, p50 {:.1f}ms, p99 {:.1f}ms, peak threads {}'.format(
+                    len(latencies) / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+                    sampler.peak,
+                )),
+            ))
+
+    def run_wsgi(self, application, path, query_string, requests, concurrency, client_delay):
+        """
+        Run the requests on a thread by client, like a threaded WSGI server does.
+        """
+        def request(index):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query_string,
+                'HTTP_HOST': 'localhost', 'HTTP_ACCEPT': 'application/json', 'wsgi.input': io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            start = time.monotonic()
+            response = application(environ, lambda status, headers, exc_info=None: None)
+            for chunk in response:
+                # The thread is held while the slow client reads.
+                time.sleep(client_delay)
+            response.close()
+            return time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(request, range(requests)))
+
+    def run_asgi(self, application, path, query_string, requests, concurrency, client_delay):
+        """
+        Run the requests as tasks of the event loop, like an ASGI server does.
+        """
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string.encode('latin1'),
+            'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                await asyncio.sleep(client_delay)
+
+        async def request(semaphore):
+            async with semaphore:
+                start = time.monotonic()
+                await application(dict(scope), receive, send)
+                return time.monotonic() - start
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*[request(semaphore) for index in range(requests)])
+
+        return asyncio.run(main())
@@ -0,0 +1,53 @@
+import sys
+from django.core.management.base import BaseCommand
+from catalog import export
+
+
+class Command(BaseCommand):
+    help = 'Export every product of the catalog, with its categories, as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            choices=export.FORMATS,
+            default='ndjson',
+            type=str,
+            help='The format of the export',
+        )
+
+        parser.add_argument(
+            '--file',
+            default=None,
+            type=str,
+            help='The path of the export file, default is the standard output',
+        )
+
+        parser.add_argument(
+            '--gzip',
+            default=False,
+            action='store_true',
+            help='Compress the export with gzip',
+        )
+
+        parser.add_argument(
+            '--chunk_size',
+            default=export.CHUNK_SIZE,
+            type=int,
+            help='The number of products fetched by query',
+        )
+
+    def handle(self, *args, **options):
+        chunks = export.export_products(options['output'], compress=options['gzip'], chunk_size=options['chunk_size'])
+
+        if options['file'] is not None:
+            mode = 'wb' if options['gzip'] else 'w'
+            with open(options['file'], mode) as file:
+                for chunk in chunks:
+                    file.write(chunk)
+            self.stderr.write(self.style.SUCCESS('Catalog exported to {}'.format(options['file'])))
+        elif options['gzip']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
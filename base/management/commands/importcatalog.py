@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from catalog.importer import BATCH_SIZE, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Import categories and products from CSV or JSON lines files, upserting the rows by slug.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--categories',
+            default=None,
+            type=str,
+            help='The path of the categories file (.csv, .jsonl or .ndjson, optionally .gz)',
+        )
+
+        parser.add_argument(
+            '--products',
+            default=None,
+            type=str,
+            help="The path of the products file (.csv, .jsonl or .ndjson, optionally .gz), "
+                 "the categories are slugs separated by '|' in CSV",
+        )
+
+        parser.add_argument(
+            '--batch_size',
+            default=BATCH_SIZE,
+            type=int,
+            help='The number of rows diffed and written by transaction',
+        )
+
+        parser.add_argument(
+            '--workers',
+            default=1,
+            type=int,
+            help='The number of processes parsing and validating the batches',
+        )
+
+        parser.add_argument(
+            '--max_errors',
+            default=20,
+            type=int,
+            help='The number of invalid rows to display',
+        )
+
+    def handle(self, *args, **options):
+        if options['categories'] is None and options['products'] is None:
+            raise CommandError('Give the --categories or --products file to import.')
+
+        importer = CatalogImporter(batch_size=options['batch_size'], workers=options['workers'])
+        for kind in ('categories', 'products'):
+            if options[kind] is None:
+                continue
+
+            try:
+                stats = importer.run(kind, options[kind])
+            except (OSError, ValueError) as e:
+                raise CommandError(e)
+
+            self.stdout.write('{} {}'.format(
+                self.style.SUCCESS('Imported {}:'.format(kind)),
+                self.style.WARNING('{created} created, {updated} updated, {unchanged} unchanged'.format(**stats)),
+            ))
+            for line, errors in stats['errors'][:options['max_errors']]:
+                self.stdout.write(self.style.ERROR('Row {}: {}'.format(line, errors)))
+            if len(stats['errors']) > options['max_errors']:
+                self.stdout.write(self.style.ERROR('{} more invalid rows'.format(
+                    len(stats['errors']) - options['max_errors']
+                )))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from catalog.changes import TOMBSTONE_DAYS, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of the change feed older than CATALOG_TOMBSTONE_DAYS.'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write('{} {}'.format(
+            self.style.SUCCESS('Deleted tombstones older than {} days:'.format(TOMBSTONE_DAYS)),
+            self.style.WARNING(deleted),
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from base.cache import bump_model_version
+from catalog.counts import get_drifted_categories, recount_categories
+from catalog.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Repair the product counts of the categories which drifted from the products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Only display the drifted categories',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(get_drifted_categories())
+        for category in drifted:
+            self.stdout.write('{}: {}/{} products, expected {}/{} (active/total)'.format(
+                category.slug, category.active_product_count, category.product_count,
+                category.expected_active_count, category.expected_count,
+            ))
+
+        if drifted and not options['dry_run']:
+            recount_categories([category.pk for category in drifted])
+            bump_model_version(Category)
+        self.stdout.write('{} {}'.format(
+            self.style.SUCCESS('Drifted categories:' if options['dry_run'] else 'Repaired categories:'),
+            self.style.WARNING(len(drifted)),
+        ))
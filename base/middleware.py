@@ -0,0 +1,81 @@
+import logging
+import random
+import time
+import uuid
+from django.conf import settings
+from .asgi import store_rendered_response
+from .db import STICKY_COOKIE, QueryCounter
+
+logger = logging.getLogger('base.requests')
+
+
+class RequestLogMiddleware:
+    """
+    Log a compact line of each request with the request id, status, duration and number of queries.
+
+    The request id is taken from the `X-Request-ID` header, or generated, and
+    returned in the response. The response body is logged only for a sample of
+    the requests, given by the `REQUEST_LOG_BODY_SAMPLE_RATE` setting from 0 to 1.
+    """
+    request_id_header = 'HTTP_X_REQUEST_ID'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.id = request.META.get(self.request_id_header) or uuid.uuid4().hex
+        start = time.monotonic()
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        duration = (time.monotonic() - start) * 1000
+
+        response['X-Request-ID'] = request.id
+        logger.info('%s %s %s %s %.1fms %d queries', request.id, request.method, request.path,
+                    response.status_code, duration, counter.count)
+        sample_rate = getattr(settings, 'REQUEST_LOG_BODY_SAMPLE_RATE', 0)
+        if sample_rate and random.random() < sample_rate:
+            logger.info('%s body: %s', request.id, self.get_body(response))
+        return response
+
+    def get_body(self, response):
+        if hasattr(response, 'data'):
+            return response.data
+        if response.streaming:
+            return '<streaming>'
+        return response.content
+
+
+class RenderedResponseMiddleware:
+    """
+    Store the rendered response of the ASGI requests marked by the `CachedResponseMixin`,
+    served next by the `base.asgi.FastPathApplication`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        marked = getattr(request, 'rendered_cache', None)
+        if (marked is not None and hasattr(request, 'scope') and response.status_code == 200
+                and not response.streaming and not response.cookies):
+            store_rendered_response(request, response, *marked)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Flag the clients which wrote with a cookie for `REPLICA_STICKY_SECONDS`, so their
+    next reads go to the primary and see their own writes, see `base.mixins.ReplicaReadMixin`.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if settings.REPLICA_DATABASES and request.method not in self.safe_methods and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
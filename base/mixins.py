@@ -0,0 +1,338 @@
+import logging
+import time
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from rest_framework.response import Response
+from .cache import get_model_versions, get_table, has_recent_writes, make_digest, make_key, metrics
+from .db import STICKY_COOKIE, QueryCounter, read_from, replicas
+from .pagination import KeysetPagination
+from .serializers import compile_serializer
+
+logger = logging.getLogger('base.mixins')
+
+
+class QueryBudgetMixin:
+    """
+    Check the number of queries of each action against a fixed budget.
+
+    The budget is a mapping of action name to the maximum number of queries,
+    eg: `query_budget = {'list': 3, 'retrieve': 2}`. When an action exceeds
+    its budget a warning is logged, which usually means a N+1 query slipped in.
+    """
+    query_budget = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        with QueryCounter() as counter:
+            response = super().dispatch(request, *args, **kwargs)
+
+        budget = self.query_budget.get(getattr(self, 'action', None))
+        if budget is not None and counter.count > budget:
+            logger.warning('Query budget exceeded on %s.%s: %d queries, budget %d',
+                           self.__class__.__name__, self.action, counter.count, budget)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Read the `GET` and `HEAD` requests from a replica of the `REPLICA_DATABASES` setting.
+
+    The reads go to the primary when the client wrote in the last `REPLICA_STICKY_SECONDS`,
+    flagged by the cookie of the `ReplicaStickinessMiddleware`, when the `replica_models`
+    were written by anyone in that window, or when no replica is healthy. A request
+    failing on the replica is marked and retried on the primary.
+
+    The `primary_actions` always read from the primary, eg: a feed which must not miss the lagging rows.
+    The writes of the `replica_models` must be flagged, by `bump_model_version` or `mark_written`.
+    """
+    replica_methods = ('GET', 'HEAD')
+    replica_models = None
+    primary_actions = ()
+
+    def get_replica_models(self):
+        """
+        Return the models read from the replica, by default the `cache_models` or the model of the queryset.
+        """
+        return self.replica_models or getattr(self, 'cache_models', None) or (self.queryset.model,)
+
+    def get_read_database(self, request):
+        if request.method not in self.replica_methods or STICKY_COOKIE in request.COOKIES:
+            return None
+        if getattr(self, 'action_map', {}).get(request.method.lower()) in self.primary_actions:
+            return None
+        alias = replicas.choose()
+        if alias is None or has_recent_writes(*self.get_replica_models()):
+            return None
+        return alias
+
+    def dispatch(self, request, *args, **kwargs):
+        alias = self.get_read_database(request)
+        if alias is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        try:
+            with read_from(alias, self.get_replica_models()):
+                return super().dispatch(request, *args, **kwargs)
+        except DatabaseError as exc:
+            replicas.mark_failed(alias, exc)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class SlugLookupMixin:
+    """
+    Look the detail routes with the `slug` kwarg up by primary key, resolved by the
+    `slug_resolver` of the view, so a slug lookup costs the same as a primary key lookup.
+
+    eg: `path('products/<slug:slug>', ...)` and `slug_resolver = SlugResolver(Product)`
+    """
+    slug_url_kwarg = 'slug'
+    slug_resolver = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.slug_url_kwarg not in self.kwargs:
+            return
+
+        pk = self.slug_resolver.resolve(self.kwargs[self.slug_url_kwarg])
+        if pk is None:
+            raise Http404
+        # The kwargs are shared with the handler.
+        self.kwargs[self.lookup_url_kwarg or self.lookup_field] = pk
+
+
+class CachedResponseMixin:
+    """
+    Cache the response data of the safe actions until the `cache_models` of the view change.
+
+    The key has the URL, the query params, the language activated by the
+    `LocaleMiddleware` and the cache versions of the models, which are bumped
+    by the signals of the models, so a changed row is never served from cache.
+
+    Under ASGI the rendered response is also stored by the `RenderedResponseMiddleware`
+    and served by the `base.asgi.FastPathApplication` without a thread.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_timeout = 300
+
+    def get_response_cache_key(self, request, versions=None):
+        return make_key(
+            'response',
+            request.build_absolute_uri(request.path),
+            sorted(request.query_params.lists()),
+            get_language(),
+            versions or get_model_versions(*self.cache_models),
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        name = '{}.{}'.format(self.__class__.__name__, self.action)
+        versions = get_model_versions(*self.cache_models)
+        key = self.get_response_cache_key(request, versions)
+        entry = cache.get(key)
+        # The rendered response is stored for the ASGI fast path, see `base.asgi`.
+        request._request.rendered_cache = (name, self.cache_models, versions, self.cache_timeout)
+
+        if entry is not None:
+            age = time.time() - entry['created']
+            metrics.hit(name, age)
+            response = Response(entry['data'], status=entry['status'])
+            response['X-Cache'] = 'HIT'
+            response['Age'] = int(age)
+            return response
+
+        metrics.miss(name)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, {'data': response.data, 'status': response.status_code, 'created': time.time()},
+                      self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.cache_actions:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.cache_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Answer the safe actions with `304 Not Modified`, without serializing, when the
+    `If-None-Match` or `If-Modified-Since` sent by the client still match.
+
+    The validators are computed from `MAX(updated_at)` and the count of the rows
+    of the response, and of the other `cache_models` of the view rendered within it.
+    They are cached like the responses, until the cache versions of the `cache_models`
+    change, so a cached response or a `304` needs no aggregation.
+    """
+    conditional_actions = ('list', 'retrieve')
+    last_modified_field = 'updated_at'
+    validators_timeout = 300
+
+    def get_validators(self, request):
+        """
+        Return a tuple with the etag and the last modified timestamp, cached by the versions of the `cache_models`.
+        """
+        cache_models = getattr(self, 'cache_models', None)
+        if not cache_models:
+            return self.compute_validators(request)
+
+        key = make_key(
+            'validators',
+            request.build_absolute_uri(request.path),
+            sorted(request.query_params.lists()),
+            get_language(),
+            request.accepted_renderer.format,
+            get_model_versions(*cache_models),
+        )
+        validators = cache.get(key)
+        if validators is None:
+            validators = self.compute_validators(request)
+            cache.set(key, validators, self.validators_timeout)
+        return tuple(validators)
+
+    def compute_validators(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+        querysets = [queryset] + [
+            model._default_manager.order_by()
+            for model in getattr(self, 'cache_models', ()) if model is not queryset.model
+        ]
+        values = [
+            qs.aggregate(last_modified=Max(self.last_modified_field), count=Count('pk')) for qs in querysets
+        ]
+        if not values[0]['count']:
+            return None, None
+
+        last_modified = max(value['last_modified'] for value in values if value['last_modified'])
+        etag = make_digest(
+            [(value['last_modified'], value['count']) for value in values],
+            sorted(request.query_params.lists()),
+            get_language(),
+            request.accepted_renderer.format,
+        )
+        return etag, int(last_modified.timestamp())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        else:
+            response = Response(status=response.status_code)
+        if response.status_code in (200, 304):
+            response['ETag'] = quote_etag(etag)
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+class SparseFieldsetMixin:
+    """
+    Trim the response of the safe actions to the fields of the `fields` query param,
+    eg: `?fields=id,title,slug`, and load only the columns of those fields.
+
+    The serializer must use the `base.serializers.SparseFieldsetMixin`.
+    """
+    fields_query_param = 'fields'
+    fields_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        """
+        Return the list of the requested field names or `None` for every field.
+        """
+        if getattr(self, 'action', None) not in self.fields_actions:
+            return None
+
+        value = self.request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+
+        serializer_fields = self.get_serializer_class()().fields
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = {queryset.model._meta.pk.name}
+        columns.update(field.lstrip('-') for field in getattr(self, 'cursor_ordering', None) or ())
+        columns.update(
+            serializer_fields[name].source for name in fields
+            if name in serializer_fields and serializer_fields[name].source in concrete
+        )
+        return queryset.only(*columns)
+
+
+class CompiledSerializerMixin:
+    """
+    Render the `compiled_actions` from `.values()` rows through the compiled
+    serializer of the view, with the same output of the serializer.
+
+    The serializer must be read-only compatible, see `base.serializers.CompiledSerializer`.
+    The rows of an unfiltered list are taken from the `LocalTable` of the model, when it has
+    every column, without a query.
+    """
+    compiled_actions = ('list',)
+
+    def get_compiled_serializer(self):
+        get_fields = getattr(self, 'get_requested_fields', None)
+        fields = get_fields() if get_fields is not None else None
+        return compile_serializer(self.get_serializer_class(), tuple(fields) if fields is not None else None)
+
+    def get_table_rows(self, queryset, columns):
+        """
+        Return the rows of the `LocalTable` of the model or `None` when the queryset is filtered,
+        ordered or paginated by cursor, or the table misses any of the columns.
+        """
+        table = get_table(queryset.model)
+        if (table is None or queryset.query.where or queryset.query.order_by
+                or not set(columns) <= set(table.fields) or KeysetPagination.cursor_query_param in self.request.GET):
+            return None
+        return list(table.get_rows().values())
+
+    def list(self, request, *args, **kwargs):
+        if self.action not in self.compiled_actions:
+            return super().list(request, *args, **kwargs)
+
+        compiled = self.get_compiled_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        columns = compiled.columns + tuple(field.lstrip('-') for field in getattr(self, 'cursor_ordering', None) or ())
+        rows = self.get_table_rows(queryset, columns)
+        if rows is None:
+            rows = queryset.values(*dict.fromkeys(columns))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.render(page, using=queryset.db))
+        return Response(compiled.render(rows, using=queryset.db))
@@ -0,0 +1,61 @@
+from django.db import IntegrityError, router, transaction
+from .helpers import generate_unique_slug
+
+
+class UniqueSlugMixin:
+    """
+    Generate the unique slug from the `slug_source` field on create when it is empty.
+
+    The slug must be unique in the database, when a concurrent create takes
+    the same slug the insert is retried with a new one.
+    """
+    slug_source = 'title'
+    slug_retries = 3
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None or self.slug:
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        for attempt in range(1, self.slug_retries + 1):
+            self.slug = generate_unique_slug(self.__class__, getattr(self, self.slug_source))
+            try:
+                with transaction.atomic(using=using):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                conflict = self.__class__._default_manager.using(using).filter(slug=self.slug).exists()
+                self.slug = ''
+                if not conflict or attempt == self.slug_retries:
+                    raise
+
+
+class TrackedFieldsMixin:
+    """
+    Keep the values of the `tracked_fields` as loaded from the database, so the
+    `post_save` receivers can tell which of them changed.
+
+    eg: `tracked_fields = ('is_active',)` and `instance.has_changed('is_active')`
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.track_fields()
+        return instance
+
+    def track_fields(self):
+        # The deferred fields are not tracked.
+        self._loaded_values = {name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__}
+
+    def get_loaded_value(self, name, default=None):
+        return getattr(self, '_loaded_values', {}).get(name, default)
+
+    def has_changed(self, name):
+        loaded = getattr(self, '_loaded_values', {})
+        return name in loaded and loaded[name] != getattr(self, name)
+
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        self.track_fields()
+        return result
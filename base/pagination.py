@@ -1,19 +1,334 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial, reduce
+from operator import or_
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from django.conf import settings
+from .cache import get_model_versions, make_key
+
+
+class ExactCount:
+    """
+    Count the rows with a `COUNT(*)` on every call.
+    """
+
+    def count(self, queryset, view=None):
+        """
+        Return a tuple with the number of rows and if the number is exact.
+        """
+        return queryset.count(), True
+
+
+class CachedCount(ExactCount):
+    """
+    Cache the exact count of each query until the models of the view change.
+
+    The cache key has the versions of the `cache_models` of the view,
+    bumped by the signals of those models.
+    """
+
+    def __init__(self, timeout=300):
+        self.timeout = timeout
+
+    def count(self, queryset, view=None):
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0, True
+
+        models = getattr(view, 'cache_models', None) or (queryset.model,)
+        key = make_key('count', queryset.db, sql, params, get_model_versions(*models))
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.timeout)
+        return total, True
+
+
+class EstimatedCount(ExactCount):
+    """
+    Use the row estimate of the query planner when it is above the threshold.
+
+    Below the threshold, or on databases without statistics, the `fallback`
+    strategy is used.
+    """
+
+    def __init__(self, threshold=10000, fallback=None):
+        self.threshold = threshold
+        self.fallback = fallback or ExactCount()
+
+    def count(self, queryset, view=None):
+        estimate = self.estimate(queryset)
+        if estimate is not None and estimate >= self.threshold:
+            return estimate, False
+        return self.fallback.count(queryset, view)
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CountStrategyPaginator(DjangoPaginator):
+    """
+    A paginator which counts the rows using a count strategy.
+    """
+
+    def __init__(self, object_list, per_page, count_strategy=None, view=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy or ExactCount()
+        self.view = view
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        total, self.count_exact = self.count_strategy.count(self.object_list, self.view)
+        return total
+
+
+class EstimatedCountPaginator(CountStrategyPaginator):
+    """
+    A paginator for the admin changelists of large tables, counting with the row estimate
+    of the query planner and with a cached exact count below the threshold.
+
+    eg: `paginator = EstimatedCountPaginator` on the `ModelAdmin`
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True):
+        super().__init__(
+            object_list, per_page, count_strategy=EstimatedCount(fallback=CachedCount()),
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+        )
+
+
+class KeysetPagination(BasePagination):
+    """
+    A keyset (cursor) based pagination over the `cursor_ordering` of the view.
+
+    The ordering must be unique, eg: `('ordering', 'id')`, so each page starts
+    right after the last row of the previous one using the index instead of
+    scanning and discarding the rows before it like an offset does.
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 25)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(view.cursor_ordering)
+
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.to_python(position, queryset.model)
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+            },
+            'page_size': self.page_size,
+            'results': data,
+        })
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in self.ordering)
+
+    def get_position_filter(self, position, reverse):
+        """
+        Build the condition `(a > x) OR (a = x AND b > y)` for the ordering `(a, b)`,
+        bounded by `a >= x` so the database can use a range scan on the index.
+        """
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            condition = Q(**{'{}__{}'.format(name, 'lt' if descending else 'gt'): position[index]})
+            for previous, value in zip(self.ordering[:index], position[:index]):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+
+        first = self.ordering[0]
+        descending = first.startswith('-') != reverse
+        bound = Q(**{'{}__{}'.format(first.lstrip('-'), 'lte' if descending else 'gte'): position[0]})
+        return bound & reduce(or_, conditions)
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            return [instance[field.lstrip('-')] for field in self.ordering]
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.get_position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+        )
+
+    def encode_cursor(self, position, reverse=False):
+        """
+        Encode the position to an opaque cursor.
+        """
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        value = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        """
+        Decode the cursor from the request to a tuple with the position and the direction.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            value = urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode('utf-8')
+            data = json.loads(value)
+            position = data['p']
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def to_python(self, position, model):
+        """
+        Convert each value of the decoded position with the model field of the ordering.
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            try:
+                model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+                value = model_field.to_python(value)
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Cursor',
+                    description=str(_('The pagination cursor value, send it empty to start from the first page.'))
+                )
+            )
+        ]
 
 
 class SimplePagination(PageNumberPagination):
+    """
+    A page number pagination, views with `cursor_ordering` may also be
+    paginated by cursor when the request has the `cursor` query param.
+
+    The total is computed by the `count_strategy` of the view, the response
+    flags with `total_exact` if the total is an estimate.
+    """
     page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 25)
+    keyset_pagination_class = KeysetPagination
+    count_strategy = ExactCount()
+
+    @property
+    def django_paginator_class(self):
+        return partial(CountStrategyPaginator, count_strategy=self.get_count_strategy(), view=self.view)
+
+    def get_count_strategy(self):
+        """
+        Return the count strategy of the view, eg: `count_strategy = CachedCount()`.
+        """
+        return getattr(self.view, 'count_strategy', None) or self.count_strategy
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        self.keyset = None
+        if getattr(view, 'cursor_ordering', None) and self.keyset_pagination_class.cursor_query_param in request.GET:
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view=view)
+        return super().paginate_queryset(queryset, request, view=view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
         return Response({
             'links': {
                 'next': self.get_next_link(),
                 'previous': self.get_previous_link(),
             },
             'total': self.page.paginator.count,
+            'total_exact': self.page.paginator.count_exact,
             'page': int(self.request.GET.get('page', 1)),
             'page_size': int(self.request.GET.get('page_size', self.page_size)),
             'results': data,
         })
+
+    def get_schema_fields(self, view):
+        fields = super().get_schema_fields(view)
+        if getattr(view, 'cursor_ordering', None):
+            fields += self.keyset_pagination_class().get_schema_fields(view)
+        return fields
@@ -0,0 +1,35 @@
+import orjson
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONParser(JSONParser):
+    """
+    A JSON parser based on orjson.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(_('JSON parse error - {error}').format(error=e))
+
+
+class MessagePackParser(BaseParser):
+    """
+    A MessagePack parser for the requests with `Content-Type: application/msgpack`.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        assert msgpack is not None, 'msgpack must be installed to use `MessagePackParser`'
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ParseError(_('MessagePack parse error - {error}').format(error=e))
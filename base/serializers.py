@@ -0,0 +1,292 @@
+from collections import defaultdict
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.db import IntegrityError, models, router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import get_attribute
+from rest_framework.relations import MANY_RELATION_KWARGS, PKOnlyObject
+from rest_framework.validators import UniqueValidator
+from .cache import get_table
+from .helpers import is_reserved_slug
+
+
+class SparseFieldsetMixin:
+    """
+    A serializer which emits only the fields given by the `fields` argument.
+
+    eg: `ProductSerializer(instance, fields=['id', 'title'])`
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CompiledSerializer:
+    """
+    A read-only serializer which renders the rows of `.values()` with the same
+    output of the serializer it is compiled from.
+
+    Each field is compiled once to its column and a converter, skipping the
+    field machinery of the serializer for every row. The nested `many`
+    serializers of a many to many relation are rendered from one query on
+    the through table.
+
+    eg: `compile_serializer(ProductSerializer).render(Product.objects.values(*columns))`
+    """
+    # The plain representations, by the `to_representation` of the field class.
+    converters = {
+        serializers.CharField.to_representation: str,
+        serializers.IntegerField.to_representation: int,
+        serializers.BooleanField.to_representation: bool,
+    }
+
+    def __init__(self, serializer):
+        self.name = serializer.__class__.__name__
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.fields = []
+        self.nested = {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.Serializer):
+                self.nested[name] = (self.get_relation(name, field.source), CompiledSerializer(field.child))
+                self.fields.append((name, self.pk, None))
+            elif isinstance(field, (serializers.BaseSerializer, serializers.RelatedField, serializers.ManyRelatedField,
+                                    serializers.SerializerMethodField)) or len(field.source_attrs) != 1:
+                raise ImproperlyConfigured('Cannot compile the field `{}` of `{}`.'.format(name, self.name))
+            else:
+                self.fields.append((name, self.get_column(name, field.source), self.get_converter(field)))
+        self.columns = tuple(dict.fromkeys([self.pk] + [column for name, column, converter in self.fields]))
+
+    def get_column(self, name, source):
+        if source == 'pk':
+            return self.pk
+        try:
+            field = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or field.is_relation:
+            raise ImproperlyConfigured('Cannot compile the field `{}` of `{}`.'.format(name, self.name))
+        return field.attname
+
+    def get_relation(self, name, source):
+        try:
+            relation = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            relation = None
+        if relation is None or not relation.many_to_many or relation.auto_created:
+            raise ImproperlyConfigured('Cannot compile the field `{}` of `{}`.'.format(name, self.name))
+        return relation
+
+    def get_converter(self, field):
+        return self.converters.get(type(field).to_representation, field.to_representation)
+
+    def render(self, rows, using=None):
+        """
+        Render the rows of `.values(*self.columns)` to a list of dicts.
+        """
+        rows = list(rows)
+        converters = []
+        for name, column, converter in self.fields:
+            if name in self.nested:
+                relation, child = self.nested[name]
+                related = child.render_related(relation, [row[self.pk] for row in rows], using=using)
+                converter = related.__getitem__
+            converters.append((name, column, converter))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, converter in converters:
+                value = row[column]
+                item[name] = None if value is None else converter(value)
+            data.append(item)
+        return data
+
+    def render_related(self, relation, ids, using=None):
+        """
+        Render the related rows of a many to many `relation` grouped by the given ids,
+        ordered like the related model.
+        """
+        through = relation.remote_field.through
+        source = relation.m2m_field_name()
+        target = relation.m2m_reverse_field_name()
+
+        table = get_table(self.model)
+        if table is not None and set(self.columns) <= set(table.fields):
+            rows = table.get_related(through, source, target, ids, using=using)
+            if rows is not None:
+                return defaultdict(list, {pk: self.render(items) for pk, items in rows.items()})
+
+        ordering = [
+            '-{}__{}'.format(target, field[1:]) if field.startswith('-') else '{}__{}'.format(target, field)
+            for field in self.model._meta.ordering if isinstance(field, str)
+        ]
+
+        queryset = through._default_manager.db_manager(using).filter(**{'{}__in'.format(source): ids})
+        rows = list(queryset.order_by(*ordering).values_list(
+            source, *['{}__{}'.format(target, column) for column in self.columns]
+        ))
+        items = self.render(dict(zip(self.columns, row[1:])) for row in rows)
+
+        related = defaultdict(list)
+        for row, item in zip(rows, items):
+            related[row[0]].append(item)
+        return related
+
+
+def get_table_related(manager, fields=()):
+    """
+    Return the rows of a many to many relation, which is not prefetched, from the `LocalTable`
+    of its model with one query on the through table, or `None` when the table can't be used.
+
+    :param `manager` is the many to many manager of an instance, eg: `product.categories`.
+    :param `fields` is the fields required in the rows.
+    """
+    if not isinstance(manager, models.Manager) or not hasattr(manager, 'through'):
+        return None
+    if manager.prefetch_cache_name in getattr(manager.instance, '_prefetched_objects_cache', {}):
+        return None
+    table = get_table(manager.model)
+    if table is None or not set(fields) <= set(table.fields):
+        return None
+
+    related = table.get_related(
+        manager.through, manager.source_field_name, manager.target_field_name, manager.related_val, using=manager.db
+    )
+    return None if related is None else related[manager.related_val[0]]
+
+
+class LocalTableListSerializer(serializers.ListSerializer):
+    """
+    Render a many to many relation from the `LocalTable` of its model, see `get_table_related`.
+
+    eg: `Meta.list_serializer_class = LocalTableListSerializer`
+    """
+
+    def to_representation(self, data):
+        rows = get_table_related(data, [field.source for field in self.child.fields.values() if not field.write_only])
+        if rows is None:
+            return super().to_representation(data)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class LocalTableManyRelatedField(serializers.ManyRelatedField):
+    """
+    Resolve and render a list of primary keys from the `LocalTable` of its model, see `get_table_related`.
+    """
+
+    def get_attribute(self, instance):
+        if hasattr(instance, 'pk') and instance.pk is None:
+            return []
+        manager = get_attribute(instance, self.source_attrs)
+        rows = get_table_related(manager)
+        if rows is None:
+            return super().get_attribute(instance)
+        pk = manager.model._meta.pk.attname
+        return [PKOnlyObject(pk=row[pk]) for row in rows]
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        rows = self.child_relation.get_table().get_rows()
+        return [self.child_relation.to_internal_value(item, rows) for item in data]
+
+
+class LocalTablePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A primary key related field resolved from the `LocalTable` of the model of the queryset, without a query.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return LocalTableManyRelatedField(**list_kwargs)
+
+    def get_table(self):
+        return get_table(self.queryset.model)
+
+    def to_internal_value(self, data, rows=None):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+
+        table = self.get_table()
+        try:
+            pk = table.model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        instance = table.get_instance(pk, rows)
+        if instance is None:
+            # The copy may not have a row created by another worker yet.
+            return super().to_internal_value(data)
+        return instance
+
+
+class LocalTableUniqueValidator(UniqueValidator):
+    """
+    A unique validator checked against the `LocalTable` of the model, then against the database.
+    """
+
+    def __call__(self, value, serializer_field):
+        field_name = serializer_field.source_attrs[-1]
+        instance = getattr(serializer_field.parent, 'instance', None)
+        for pk, row in get_table(self.queryset.model).get_rows().items():
+            if row[field_name] == value and (instance is None or pk != instance.pk):
+                raise ValidationError(self.message, code='unique')
+        super().__call__(value, serializer_field)
+
+
+class UniqueSlugSerializerMixin:
+    """
+    Answer a `slug` taken by a concurrent write, after the validators, as a validation error.
+    """
+
+    def save(self, **kwargs):
+        model = self.Meta.model
+        try:
+            with transaction.atomic(using=router.db_for_write(model)):
+                return super().save(**kwargs)
+        except IntegrityError:
+            slug = self.validated_data.get('slug')
+            queryset = model._default_manager.filter(slug=slug).exclude(pk=getattr(self.instance, 'pk', None))
+            if not slug or not queryset.exists():
+                raise
+            raise ValidationError({'slug': [UniqueValidator.message]}, code='unique')
+
+
+class ReservedSlugValidator:
+    """
+    Reject the reserved slugs of the model, see `base.helpers.is_reserved_slug`.
+    """
+    message = _('This slug is reserved.')
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, value):
+        if is_reserved_slug(self.model, value):
+            raise ValidationError(self.message, code='reserved')
+
+
+@lru_cache(maxsize=128)
+def compile_serializer(serializer_class, fields=None):
+    """
+    Return the compiled serializer of a serializer class, cached by the class and the tuple of `fields`.
+    """
+    kwargs = {'fields': list(fields)} if fields is not None else {}
+    return CompiledSerializer(serializer_class(**kwargs))
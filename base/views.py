@@ -0,0 +1,14 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .cache import metrics
+
+
+class CacheMetricsView(APIView):
+    """
+    Return the hit ratio and the staleness, in seconds, of the cached responses of this worker.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(metrics.as_dict())
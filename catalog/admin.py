@@ -1,29 +1,122 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _, ngettext
+from base.cache import bump_model_version
+from base.pagination import EstimatedCountPaginator
 from .models import Category, Product
+from . import bulk, counts, search
+
+
+class ProductActionForm(ActionForm):
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.all(),
+        required=False,
+        label=_('Category'),
+        widget=AutocompleteSelect(Product.categories.field.remote_field, admin.site),
+    )
 
 
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'created_at',)
-    list_filter = ('title',)
-    search_fields = ('title', 'slug',)
-    ordering = ('title',)
+    list_display = ('title', 'slug', 'product_count', 'active_product_count', 'created_at',)
+    search_fields = ('^title', '^slug',)
+    ordering = ('title', 'id',)
     filter_horizontal = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = [
         (None, {'fields': ['title', 'slug']}),
     ]
 
 
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'created_at', 'ordering',)
-    list_filter = ('title',)
-    search_fields = ('title', 'slug',)
-    ordering = ('title',)
-    filter_horizontal = ()
+    list_display = ('title', 'slug', 'created_at', 'ordering', 'is_active',)
+    list_filter = ('is_active',)
+    search_fields = ('title',)
+    ordering = ('ordering', 'id',)
+    autocomplete_fields = ('categories',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = ProductActionForm
+    actions = ('activate_products', 'deactivate_products', 'reassign_category',)
     fieldsets = [
         (None, {'fields': ['title', 'slug', 'brand', 'ordering', 'is_active']}),
         (None, {'fields': ['description', 'categories']}),
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the products in the text index of the database, instead of `icontains` over the table.
+        """
+        if not search_term.strip() or not search.is_supported(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return search.search(queryset, search_term), False
+
+    def set_active(self, request, queryset, is_active):
+        """
+        Change the state of the products in one `UPDATE`, recounting the active products of their categories.
+        """
+        through = Product.categories.through
+        with transaction.atomic():
+            changed = queryset.exclude(is_active=is_active)
+            category_ids = set(through.objects.filter(product__in=changed).values_list('category_id', flat=True))
+            total = Product.objects.filter(pk__in=changed.values('pk')).update(
+                is_active=is_active, updated_at=timezone.now()
+            )
+            counts.recount_categories(category_ids)
+        bump_model_version(Product, Category)
+        return total
+
+    def activate_products(self, request, queryset):
+        total = self.set_active(request, queryset, True)
+        self.message_user(request, ngettext(
+            '%d product was activated.', '%d products were activated.', total
+        ) % total, messages.SUCCESS)
+    activate_products.short_description = _('Activate selected products')
+    activate_products.allowed_permissions = ('change',)
+
+    def deactivate_products(self, request, queryset):
+        total = self.set_active(request, queryset, False)
+        self.message_user(request, ngettext(
+            '%d product was deactivated.', '%d products were deactivated.', total
+        ) % total, messages.SUCCESS)
+    deactivate_products.short_description = _('Deactivate selected products')
+    deactivate_products.allowed_permissions = ('change',)
+
+    def reassign_category(self, request, queryset):
+        """
+        Replace the categories of the products by the category of the action form, with one
+        `DELETE` of the links and batched inserts, recounting the categories involved.
+        """
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        category = form.cleaned_data['category'] if form.is_valid() else None
+        if category is None:
+            self.message_user(request, _('Select the category to reassign the products to.'), messages.WARNING)
+            return
+
+        through = Product.categories.through
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True))
+            links = through.objects.filter(product__in=queryset.values('pk'))
+            category_ids = set(links.values_list('category_id', flat=True)) | {category.pk}
+            links.delete()
+            through.objects.bulk_create(
+                [through(product_id=pk, category_id=category.pk) for pk in ids], batch_size=bulk.BATCH_SIZE
+            )
+            Product.objects.filter(pk__in=queryset.values('pk')).update(updated_at=timezone.now())
+            counts.recount_categories(category_ids)
+        bump_model_version(Product, Category)
+        self.message_user(request, ngettext(
+            '%(count)d product was reassigned to %(category)s.',
+            '%(count)d products were reassigned to %(category)s.', len(ids)
+        ) % {'count': len(ids), 'category': category}, messages.SUCCESS)
+    reassign_category.short_description = _('Reassign selected products to the category')
+    reassign_category.allowed_permissions = ('change',)
+
 
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
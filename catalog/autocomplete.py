@@ -0,0 +1,225 @@
+"""
+Autocomplete of the product titles, the brands and the category titles from a per-worker
+prefix index, a sorted list of keys searched with `bisect`, so a lookup costs the same on
+any catalog size and runs no query.
+
+The index is loaded once per worker and refreshed incrementally when the cache versions of
+the models change, with the rows whose `updated_at` is after the last refresh and the
+tombstones of the deleted rows, see `catalog.changes`. For `LAG` seconds after a change the
+refresh is repeated every `REFRESH_SECONDS`, for the rows of the transactions still in flight.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from base.cache import get_model_versions
+from .models import Category, Product, Tombstone
+from .search import TOKEN_RE
+from . import changes
+
+LIMIT = getattr(settings, 'CATALOG_AUTOCOMPLETE_LIMIT', 10)
+REFRESH_SECONDS = getattr(settings, 'CATALOG_AUTOCOMPLETE_REFRESH_SECONDS', 1)
+
+# The words of a title starting a key, and the length of the keys, typed prefixes
+# longer than `KEY_LENGTH` match on their first `KEY_LENGTH` characters.
+MAX_WORDS = 8
+KEY_LENGTH = 40
+
+
+def normalize(text):
+    """
+    Return the words of the text, lower cased and without accents, separated by a space.
+    """
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(TOKEN_RE.findall(text.casefold()))
+
+
+def get_keys(text):
+    """
+    Return the keys of the text, one from each of its first words, so any word of the text matches.
+    """
+    words = normalize(text).split()
+    return list(dict.fromkeys(' '.join(words[index:])[:KEY_LENGTH] for index in range(min(len(words), MAX_WORDS))))
+
+
+class PrefixIndex:
+    """
+    A sorted list of `(key, id)` entries matched by prefix with `bisect`.
+    """
+    # Above this number of changed ids the entries are filtered and sorted again, instead of one by one.
+    sort_threshold = 1000
+
+    def __init__(self):
+        self.entries = []
+        self.keys = {}
+
+    def update(self, items):
+        """
+        Replace the keys of each id, the ids without keys are removed.
+
+        :param `items` is a dict of the list of keys by id.
+        """
+        if len(items) > self.sort_threshold:
+            self.entries = [entry for entry in self.entries if entry[1] not in items]
+            self.entries.extend((key, pk) for pk, keys in items.items() for key in keys)
+            self.entries.sort()
+        else:
+            for pk, keys in items.items():
+                for key in self.keys.get(pk, ()):
+                    index = bisect_left(self.entries, (key, pk))
+                    if index < len(self.entries) and self.entries[index] == (key, pk):
+                        del self.entries[index]
+                for key in keys:
+                    insort(self.entries, (key, pk))
+
+        for pk, keys in items.items():
+            if keys:
+                self.keys[pk] = keys
+            else:
+                self.keys.pop(pk, None)
+
+    def match(self, prefix, limit):
+        """
+        Return the first `limit` ids with a key starting with the prefix, in the order of the keys.
+        """
+        ids = {}
+        index = bisect_left(self.entries, (prefix,))
+        while len(ids) < limit and index < len(self.entries):
+            key, pk = self.entries[index]
+            if not key.startswith(prefix):
+                break
+            ids.setdefault(pk)
+            index += 1
+        return list(ids)
+
+
+class Autocomplete:
+    """
+    The prefix indexes of the active products by title, of their brands and of the categories by title.
+
+    eg: `Autocomplete().suggest('red run')`
+    """
+    product_fields = ('id', 'title', 'slug', 'brand', 'is_active')
+    category_fields = ('id', 'title', 'slug')
+
+    def __init__(self):
+        # The `refresh_lock` is held while querying, the `lock` while changing or reading the indexes.
+        self.refresh_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.versions = None
+        self.refreshed_at = 0
+        self.settled_at = 0
+        self.since = {Product: None, Category: None}
+        self.products = {}
+        self.categories = {}
+        self.brands = Counter()
+        self.product_index = PrefixIndex()
+        self.brand_index = PrefixIndex()
+        self.category_index = PrefixIndex()
+
+    def is_current(self, versions, now):
+        if versions != self.versions:
+            return False
+        return now >= self.settled_at or now - self.refreshed_at < REFRESH_SECONDS
+
+    def refresh(self):
+        """
+        Apply the rows changed and deleted since the last refresh, when the models changed.
+        """
+        versions = get_model_versions(Product, Category)
+        if self.is_current(versions, time.monotonic()):
+            return
+        # Until loaded every request waits, then a request finding a refresh running serves the current indexes.
+        if not self.refresh_lock.acquire(blocking=self.versions is None):
+            return
+        try:
+            now = time.monotonic()
+            if self.is_current(versions, now):
+                return
+            if versions != self.versions:
+                self.settled_at = now + changes.LAG
+            self.versions, self.refreshed_at = versions, now
+
+            products = self.get_changed(Product, self.product_fields)
+            categories = self.get_changed(Category, self.category_fields)
+            with self.lock:
+                self.apply_products(*products)
+                self.apply_categories(*categories)
+        finally:
+            self.refresh_lock.release()
+
+    def get_changed(self, model, fields):
+        """
+        Return a tuple with the rows of the model changed since the last refresh and the deleted ids.
+        """
+        since = self.since[model]
+        rows = model._default_manager.db_manager(DEFAULT_DB_ALIAS).order_by()
+        deleted = []
+        if since is not None:
+            # The last `LAG` seconds are read again, for the rows committed since.
+            start = since - timedelta(seconds=changes.LAG)
+            rows = rows.filter(updated_at__gt=start)
+            deleted = Tombstone.objects.using(DEFAULT_DB_ALIAS).filter(
+                model=model._meta.label_lower, deleted_at__gt=start
+            ).values_list('object_id', flat=True)
+
+        rows = list(rows.values(*fields, 'updated_at'))
+        if rows:
+            latest = max(row.pop('updated_at') for row in rows)
+            self.since[model] = latest if since is None else max(since, latest)
+        return rows, list(deleted)
+
+    def apply_products(self, rows, deleted):
+        changed = {row['id']: row if row.pop('is_active') else None for row in rows}
+        changed.update(dict.fromkeys(deleted))
+
+        brands = set()
+        for pk, row in changed.items():
+            previous = self.products.pop(pk, None)
+            if previous is not None:
+                self.brands[previous['brand']] -= 1
+                brands.add(previous['brand'])
+            if row is not None:
+                self.products[pk] = row
+                self.brands[row['brand']] += 1
+                brands.add(row['brand'])
+
+        self.product_index.update({pk: get_keys(row['title']) if row else [] for pk, row in changed.items()})
+        self.brand_index.update({brand: get_keys(brand) if self.brands[brand] > 0 else [] for brand in brands})
+        for brand in brands:
+            if self.brands[brand] <= 0:
+                del self.brands[brand]
+
+    def apply_categories(self, rows, deleted):
+        changed = {row['id']: row for row in rows}
+        changed.update(dict.fromkeys(deleted))
+        for pk, row in changed.items():
+            if row is None:
+                self.categories.pop(pk, None)
+            else:
+                self.categories[pk] = row
+        self.category_index.update({pk: get_keys(row['title']) if row else [] for pk, row in changed.items()})
+
+    def suggest(self, text, limit=None):
+        """
+        Return the products, brands and categories with a word starting with the text, the first `limit` of each.
+        """
+        limit = limit or LIMIT
+        prefix = normalize(text)[:KEY_LENGTH]
+        if not prefix:
+            return {'products': [], 'brands': [], 'categories': []}
+
+        self.refresh()
+        with self.lock:
+            return {
+                'products': [self.products[pk] for pk in self.product_index.match(prefix, limit)],
+                'brands': self.brand_index.match(prefix, limit),
+                'categories': [self.categories[pk] for pk in self.category_index.match(prefix, limit)],
+            }
+
+
+index = Autocomplete()
@@ -0,0 +1,184 @@
+"""
+Bulk writes of products, validated and written with set-based queries.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from base.cache import bump_model_version
+from base.helpers import generate_unique_slugs
+from .models import Category, Product, Tombstone, category_table, product_slugs
+from .serializers import ProductBulkItemSerializer
+from . import counts, search
+
+BATCH_SIZE = getattr(settings, 'CATALOG_BULK_BATCH_SIZE', 500)
+SLUG_RETRIES = 3
+
+
+class BulkValidationError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def validate_products(items):
+    """
+    Validate a batch of products, returning the list of validated data.
+
+    :param `items` is the list of products, the ones with `id` are updates.
+    :raises `BulkValidationError` with the errors by index of item.
+    """
+    errors = {}
+    validated = []
+    for index, item in enumerate(items):
+        serializer = ProductBulkItemSerializer(data=item, partial=isinstance(item, dict) and 'id' in item)
+        if serializer.is_valid():
+            validated.append(serializer.validated_data)
+        else:
+            errors[index] = serializer.errors
+            validated.append(None)
+
+    def add_error(index, field, message):
+        errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    valid = [(index, data) for index, data in enumerate(validated) if data is not None]
+
+    category_ids = {pk for index, data in valid for pk in data.get('categories', [])}
+    existing_categories = category_ids & set(category_table.get_rows())
+    for index, data in valid:
+        for pk in data.get('categories', []):
+            if pk not in existing_categories:
+                message = _('Invalid pk "{pk_value}" - object does not exist.').format(pk_value=pk)
+                add_error(index, 'categories', message)
+
+    update_ids = [data['id'] for index, data in valid if 'id' in data]
+    existing_products = set(Product.objects.filter(pk__in=update_ids).values_list('pk', flat=True))
+    seen_ids = set()
+    for index, data in valid:
+        if 'id' not in data:
+            continue
+        if data['id'] not in existing_products:
+            add_error(index, 'id', _('Not found.'))
+        elif data['id'] in seen_ids:
+            add_error(index, 'id', _('Duplicated in the batch.'))
+        seen_ids.add(data['id'])
+
+    slugs = [data['slug'] for index, data in valid if 'slug' in data]
+    owners = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+    seen_slugs = set()
+    for index, data in valid:
+        if 'slug' not in data:
+            continue
+        if data['slug'] in seen_slugs:
+            add_error(index, 'slug', _('Duplicated in the batch.'))
+        elif data['slug'] in owners and owners[data['slug']] != data.get('id'):
+            add_error(index, 'slug', _('This field must be unique.'))
+        seen_slugs.add(data['slug'])
+
+    if errors:
+        raise BulkValidationError(errors)
+    return validated
+
+
+def write_products(validated, retries=SLUG_RETRIES):
+    """
+    Create and update a validated batch of products in one transaction, retried on a slug taken concurrently.
+
+    :param `validated` is the list returned by `validate_products`.
+    :return a tuple with the list of created ids and the list of updated ids.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            return _write_products([dict(data) for data in validated])
+        except IntegrityError:
+            if attempt == retries:
+                raise
+
+
+@transaction.atomic
+def _write_products(validated):
+    now = timezone.now()
+    creates = [data for data in validated if 'id' not in data]
+    updates = [data for data in validated if 'id' in data]
+
+    reserved = {data['slug'] for data in validated if 'slug' in data}
+    missing = [data for data in creates if 'slug' not in data]
+    for data, slug in zip(missing, generate_unique_slugs(Product, [data['title'] for data in missing], reserved)):
+        data['slug'] = slug
+
+    fields = [field.name for field in Product._meta.concrete_fields if not field.primary_key]
+    Product.objects.bulk_create([
+        Product(**{key: value for key, value in data.items() if key in fields}) for data in creates
+    ], batch_size=BATCH_SIZE)
+
+    # SQLite does not return the ids of a bulk insert, the slugs of the batch are unique.
+    created_ids = dict(Product.objects.filter(slug__in=[data['slug'] for data in creates]).values_list('slug', 'pk'))
+    created = [created_ids[data['slug']] for data in creates]
+
+    instances = Product.objects.in_bulk([data['id'] for data in updates])
+    update_fields = {'updated_at'}
+    for data in updates:
+        instance = instances[data['id']]
+        for key, value in data.items():
+            if key in fields:
+                setattr(instance, key, value)
+                update_fields.add(key)
+        instance.updated_at = now
+    Product.objects.bulk_update(instances.values(), sorted(update_fields), batch_size=BATCH_SIZE)
+    if 'slug' in update_fields:
+        product_slugs.invalidate()
+
+    through = Product.categories.through
+    replaced = [data['id'] for data in updates if 'categories' in data]
+    category_ids = set(through.objects.filter(product_id__in=replaced).values_list('category_id', flat=True))
+    through.objects.filter(product_id__in=replaced).delete()
+    through.objects.bulk_create([
+        through(product_id=product_id, category_id=category_id)
+        for product_id, data in zip(created + [data['id'] for data in updates], creates + updates)
+        for category_id in dict.fromkeys(data.get('categories', []))
+    ], batch_size=BATCH_SIZE)
+
+    updated = [data['id'] for data in updates]
+    category_ids.update(through.objects.filter(product_id__in=created + updated).values_list('category_id', flat=True))
+    counts.recount_categories(category_ids)
+    search.index_products(created + updated)
+    bump_model_version(Product, Category)
+    return created, updated
+
+
+@transaction.atomic
+def delete_products(ids):
+    """
+    Delete a batch of products in one transaction, applying the side effects of their signals once.
+
+    :return the number of deleted products.
+    """
+    ids = list(ids)
+    through = Product.categories.through
+    # The products are deleted without the collector, so the links must be the only rows referencing them.
+    related = {relation.related_model for relation in get_candidate_relations_to_delete(Product._meta)}
+    assert related == {through}, 'delete_products must delete the rows of %s' % ', '.join(
+        sorted(model._meta.label for model in related - {through}))
+    category_ids = set()
+    deleted = 0
+    for index in range(0, len(ids), BATCH_SIZE):
+        queryset = Product.objects.filter(pk__in=ids[index:index + BATCH_SIZE])
+        existing = list(queryset.values_list('pk', flat=True))
+        if not existing:
+            continue
+
+        links = through.objects.filter(product_id__in=existing)
+        category_ids.update(links.values_list('category_id', flat=True))
+        links.delete()
+        search.unindex_products(existing)
+        Tombstone.objects.bulk_create([
+            Tombstone(model=Product._meta.label_lower, object_id=pk) for pk in existing
+        ], batch_size=BATCH_SIZE)
+        deleted += queryset._raw_delete(queryset.db)
+
+    if deleted:
+        counts.recount_categories(category_ids)
+        product_slugs.invalidate()
+        bump_model_version(Product, Category)
+    return deleted
@@ -0,0 +1,114 @@
+"""
+The change feed of the catalog: the rows changed after a cursor, in `(updated_at, id)`
+order on its index, with the ids of the deleted rows from their tombstones.
+
+The feed trails the clock by `LAG` seconds, so the rows of a transaction still in
+flight are committed before the cursor moves past their `updated_at`.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Tombstone
+
+LAG = getattr(settings, 'CATALOG_CHANGES_LAG', 5)
+PAGE_SIZE = getattr(settings, 'CATALOG_CHANGES_PAGE_SIZE', 500)
+TOMBSTONE_DAYS = getattr(settings, 'CATALOG_TOMBSTONE_DAYS', 30)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class ExpiredCursor(Exception):
+    """
+    The cursor is older than the tombstones kept, the client must sync from the start.
+    """
+
+
+def encode_cursor(position):
+    # The full `isoformat()`, the encoder of Django truncates the microseconds.
+    changed_at, pk = position
+    value = json.dumps([changed_at.isoformat(), pk], separators=(',', ':'))
+    return urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(encoded):
+    """
+    Decode the cursor to a position `(changed_at, id)`, the id is `None` for a cursor of `updated_since`.
+    """
+    try:
+        value = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode('utf-8'))
+        changed_at, pk = parse_datetime(value[0]), None if value[1] is None else int(value[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise InvalidCursor()
+    if changed_at is None:
+        raise InvalidCursor()
+    return changed_at, pk
+
+
+def get_position_filter(position, changed_field, pk_field):
+    changed_at, pk = position
+    condition = Q(**{'{}__gt'.format(changed_field): changed_at})
+    if pk is not None:
+        condition |= Q(**{changed_field: changed_at, '{}__gt'.format(pk_field): pk})
+    return condition
+
+
+def get_tombstones_start():
+    return timezone.now() - timedelta(days=TOMBSTONE_DAYS)
+
+
+def get_changes(queryset, columns, position=None, limit=None):
+    """
+    Return the changes after the position, as a tuple with the `.values()` rows of the changed
+    rows, the ids of the deleted rows, the position of the last change and if there are more.
+
+    :param `queryset` is the queryset of the rows, eg: `Product.objects.all()`.
+    :param `columns` is the columns of the rows.
+    :param `position` is a tuple `(changed_at, id)`, an id of `None` takes every id of the instant.
+    :param `limit` is the maximum number of changes, by default `PAGE_SIZE`.
+    """
+    limit = limit or PAGE_SIZE
+    if position is not None and position[0] < get_tombstones_start():
+        raise ExpiredCursor()
+
+    model = queryset.model
+    pk = model._meta.pk.attname
+    until = timezone.now() - timedelta(seconds=LAG)
+
+    rows = queryset.filter(updated_at__lte=until).order_by('updated_at', pk)
+    tombstones = Tombstone.objects.using(queryset.db).filter(model=model._meta.label_lower, deleted_at__lte=until)
+    if position is not None:
+        rows = rows.filter(get_position_filter(position, 'updated_at', pk))
+        tombstones = tombstones.filter(get_position_filter(position, 'deleted_at', 'object_id'))
+    tombstones = tombstones.order_by('deleted_at', 'object_id').values_list('deleted_at', 'object_id')
+
+    # Each source has its first `limit + 1` changes, enough for the first `limit` of both.
+    changes = [(row['updated_at'], row[pk], row) for row in rows.values(*columns, 'updated_at')[:limit + 1]]
+    changes += [(deleted_at, object_id, None) for deleted_at, object_id in tombstones[:limit + 1]]
+    changes.sort(key=lambda change: change[:2])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    if changes:
+        position = changes[-1][:2]
+    return (
+        [row for changed_at, pk, row in changes if row is not None],
+        [pk for changed_at, pk, row in changes if row is None],
+        position,
+        has_more,
+    )
+
+
+def prune_tombstones():
+    """
+    Delete the tombstones older than `TOMBSTONE_DAYS`.
+
+    :return the number of deleted tombstones.
+    """
+    deleted, _rows = Tombstone.objects.filter(deleted_at__lt=get_tombstones_start()).delete()
+    return deleted
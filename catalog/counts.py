@@ -0,0 +1,91 @@
+"""
+The materialized product counts of the categories, kept current by the signals
+and recounted by the bulk writes and the `reconcilecategorycounts` command.
+"""
+from collections import defaultdict
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Category, Product
+
+
+def adjust_counts(category_ids, total=0, active=0, using=None):
+    """
+    Add the `total` and `active` deltas to the counts of the categories, in one query.
+
+    :param `category_ids` is a list of category ids or a queryset of them.
+    """
+    changes = {}
+    if total:
+        changes['product_count'] = F('product_count') + total
+    if active:
+        changes['active_product_count'] = F('active_product_count') + active
+    if not changes:
+        return 0
+    # The counts are rendered within the category, so it is touched as modified.
+    return Category.objects.using(using).filter(pk__in=category_ids).update(updated_at=timezone.now(), **changes)
+
+
+def apply_links(links, sign=1, using=None):
+    """
+    Count the added links, or the removed ones with `sign=-1`, in the categories.
+
+    :param `links` is the list of tuples (product id, category id).
+    """
+    if not links:
+        return
+    active = set(Product.objects.using(using).filter(
+        pk__in={product_id for product_id, category_id in links}, is_active=True
+    ).values_list('pk', flat=True))
+
+    deltas = defaultdict(lambda: [0, 0])
+    for product_id, category_id in links:
+        deltas[category_id][0] += sign
+        if product_id in active:
+            deltas[category_id][1] += sign
+
+    # The categories with the same deltas are updated together.
+    groups = defaultdict(list)
+    for category_id, (total, active_total) in deltas.items():
+        groups[(total, active_total)].append(category_id)
+    for (total, active_total), category_ids in groups.items():
+        adjust_counts(category_ids, total, active_total, using=using)
+
+
+def get_count_subqueries():
+    """
+    Return the subqueries which count the products and the active products of the outer category.
+    """
+    links = Product.categories.through.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id')
+    total = links.annotate(total=Count('pk')).values('total')
+    active = links.filter(product__is_active=True).annotate(total=Count('pk')).values('total')
+    return (
+        Coalesce(Subquery(total, output_field=IntegerField()), Value(0)),
+        Coalesce(Subquery(active, output_field=IntegerField()), Value(0)),
+    )
+
+
+def recount_categories(category_ids=None, using=None):
+    """
+    Recount the products of the categories, or of every category, in one query.
+
+    :return the number of recounted categories.
+    """
+    queryset = Category.objects.using(using)
+    if category_ids is not None:
+        queryset = queryset.filter(pk__in=category_ids)
+    total, active = get_count_subqueries()
+    return queryset.update(product_count=total, active_product_count=active, updated_at=timezone.now())
+
+
+def get_drifted_categories(using=None):
+    """
+    Return the categories which counts differ from the links, with the `expected_count`
+    and `expected_active_count` annotated.
+    """
+    total, active = get_count_subqueries()
+    return Category.objects.using(using).annotate(
+        expected_count=total, expected_active_count=active
+    ).exclude(
+        product_count=F('expected_count'), active_product_count=F('expected_active_count')
+    ).order_by('pk')
@@ -0,0 +1,107 @@
+"""
+Streaming export of the catalog, with flat memory regardless of the catalog size.
+"""
+import csv
+import io
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Product
+
+CHUNK_SIZE = 2000
+
+PRODUCT_FIELDS = ('id', 'title', 'slug', 'description', 'brand', 'is_active', 'ordering')
+CATEGORY_FIELDS = ('id', 'title', 'slug')
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_products(queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield each product as a dict with its categories, walking the rows with a
+    server-side cursor and fetching the categories of each chunk in one query.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values(*PRODUCT_FIELDS).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_categories(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_categories(chunk)
+
+
+def _with_categories(chunk):
+    through = Product.categories.through
+    categories = {}
+    links = through.objects.filter(product_id__in=[row['id'] for row in chunk]).values_list(
+        'product_id', *['category__{}'.format(field) for field in CATEGORY_FIELDS]
+    ).order_by('category__title')
+    for product_id, *values in links:
+        categories.setdefault(product_id, []).append(dict(zip(CATEGORY_FIELDS, values)))
+
+    for row in chunk:
+        row['categories'] = categories.get(row['id'], [])
+        yield row
+
+
+def iter_ndjson(products):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for product in products:
+        yield encoder.encode(product) + '\n'
+
+
+def iter_csv(products):
+    """
+    Yield the products as CSV lines, the categories are the slugs separated by `|`.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_FIELDS + ('categories',))
+    for product in products:
+        writer.writerow([product[field] for field in PRODUCT_FIELDS] + [
+            '|'.join(category['slug'] for category in product['categories'])
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_gzip(lines, flush_size=64 * 1024):
+    """
+    Compress the lines to a gzip stream, yielding blocks of about `flush_size` bytes.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = []
+    size = 0
+    for line in lines:
+        data = compressor.compress(line.encode('utf-8'))
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= flush_size:
+            yield b''.join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def export_products(output='ndjson', compress=False, queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Return an iterator of the exported products.
+
+    :param `output` is the format, `ndjson` or `csv`.
+    :param `compress` to gzip the output, yielding bytes instead of text.
+    """
+    if output not in FORMATS:
+        raise ValueError('Unknown export format: {}'.format(output))
+
+    products = iter_products(queryset, chunk_size=chunk_size)
+    lines = iter_ndjson(products) if output == 'ndjson' else iter_csv(products)
+    return iter_gzip(lines) if compress else lines
@@ -0,0 +1,51 @@
+"""
+The facets of the products, the number of products of each brand, category and state
+among the products of a filtered queryset, with one grouped query by facet.
+"""
+from django.conf import settings
+from django.db.models import Count
+from .models import Product, category_table
+
+FACETS = ('brand', 'categories', 'is_active')
+LIMIT = getattr(settings, 'CATALOG_FACETS_LIMIT', 100)
+
+
+def get_brand_facet(queryset, limit):
+    rows = queryset.order_by().values('brand').annotate(count=Count('pk')).order_by('-count', 'brand')[:limit]
+    return [{'value': row['brand'], 'count': row['count']} for row in rows]
+
+
+def get_categories_facet(queryset, limit):
+    # Grouped on the through table, the titles are from the per-worker category table.
+    through = Product.categories.through
+    rows = through.objects.using(queryset.db).filter(
+        product_id__in=queryset.order_by().values('pk')
+    ).values('category_id').annotate(count=Count('product_id')).order_by('-count', 'category_id')[:limit]
+    categories = category_table.get_rows()
+    return [
+        {
+            'value': row['category_id'],
+            'title': categories[row['category_id']]['title'] if row['category_id'] in categories else None,
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+
+
+def get_is_active_facet(queryset, limit):
+    rows = queryset.order_by().values('is_active').annotate(count=Count('pk')).order_by('-is_active')
+    return [{'value': row['is_active'], 'count': row['count']} for row in rows]
+
+
+def get_facets(queryset, facets=FACETS, limit=None):
+    """
+    Return the counts of each value of the facets among the products of the queryset,
+    the most frequent values first.
+
+    :param `queryset` is the filtered product queryset, eg: `ProductFilter(params).qs`.
+    :param `facets` is the names of the facets, of `FACETS`.
+    :param `limit` is the maximum number of values of each facet, by default `LIMIT`.
+    """
+    limit = limit or LIMIT
+    getters = {'brand': get_brand_facet, 'categories': get_categories_facet, 'is_active': get_is_active_facet}
+    return {name: getters[name](queryset, limit) for name in facets}
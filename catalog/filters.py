@@ -0,0 +1,62 @@
+from django.utils.translation import gettext_lazy as _
+from django_filters import rest_framework as filters
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.filters import BaseFilterBackend
+from .models import Product
+from . import search
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    Filter products by categories, brand, state and creation or modification ranges,
+    eg: `?categories=1,2&brand=Acme&is_active=true&updated_at_after=2020-06-17T00:00:00Z`
+    """
+    categories = NumberInFilter(
+        method='filter_categories', help_text=_('Comma separated ids of the categories of the product.')
+    )
+    brand = filters.CharFilter(help_text=_('The brand of the product.'))
+    is_active = filters.BooleanFilter(help_text=_('The state of the product.'))
+    created_at = filters.IsoDateTimeFromToRangeFilter(help_text=_('The creation date range of the product.'))
+    updated_at = filters.IsoDateTimeFromToRangeFilter(help_text=_('The modification date range of the product.'))
+
+    class Meta:
+        model = Product
+        fields = ('categories', 'brand', 'is_active', 'created_at', 'updated_at')
+
+    def filter_categories(self, queryset, name, value):
+        # A semi-join on the through table, which never duplicates the products.
+        through = Product.categories.through
+        return queryset.filter(pk__in=through.objects.filter(category_id__in=value).values('product_id'))
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text search of products by title, brand and description, ranked by relevance.
+    """
+    search_param = 'q'
+    search_description = _('A text to search in the title, brand and description of the product.')
+
+    def get_search_query(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return search.search(queryset, query)
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.search_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Search', description=str(self.search_description))
+            )
+        ]
@@ -0,0 +1,263 @@
+"""
+Import of the catalog from CSV or JSON lines files, upserting the rows by slug.
+
+The files are read in batches, each batch is validated, optionally in a pool
+of processes, then diffed against the existing rows with one query and only
+the changes are written with `bulk_create` and `bulk_update`.
+"""
+import csv
+import gzip
+import json
+from concurrent.futures import ProcessPoolExecutor
+from django import setup
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from base.cache import bump_model_version
+from base.helpers import is_reserved_slug
+from base.serializers import ReservedSlugValidator
+from .models import Category, Product, category_table
+from .serializers import CategoryImportSerializer, ProductImportSerializer
+from . import counts, search
+
+BATCH_SIZE = 1000
+
+PRODUCT_FIELDS = ('title', 'description', 'brand', 'is_active', 'ordering')
+
+
+def read_rows(path):
+    """
+    Yield the rows of a `.csv`, `.jsonl` or `.ndjson` file, optionally gzipped with the `.gz` suffix.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if name.endswith('.csv'):
+            yield from csv.DictReader(file)
+        elif name.endswith(('.jsonl', '.ndjson')):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError('Unknown file format: {}, use .csv, .jsonl or .ndjson'.format(path))
+
+
+def read_batches(path, batch_size=BATCH_SIZE):
+    """
+    Yield tuples with the number of the first row and the list of rows of each batch.
+    """
+    batch = []
+    start = 1
+    for number, row in enumerate(read_rows(path), start=1):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield start, batch
+            batch, start = [], number + 1
+    if batch:
+        yield start, batch
+
+
+def normalize_row(row):
+    """
+    Drop the empty values of CSV rows and read the categories as a list of slugs.
+    """
+    row = {key: value for key, value in row.items() if value not in ('', None)}
+    categories = row.get('categories')
+    if isinstance(categories, str):
+        row['categories'] = [slug for slug in categories.split('|') if slug]
+    elif isinstance(categories, list):
+        row['categories'] = [item['slug'] if isinstance(item, dict) else item for item in categories]
+    return row
+
+
+def validate_batch(kind, start, rows):
+    """
+    Validate a batch of rows without touching the database, so it can run in another process.
+
+    :param `kind` is `categories` or `products`.
+    :return a tuple with the list of validated rows and the list of errors by row number.
+    """
+    serializer_class = CategoryImportSerializer if kind == 'categories' else ProductImportSerializer
+    valid = {}
+    errors = []
+    for number, row in enumerate(rows, start=start):
+        serializer = serializer_class(data=normalize_row(row) if isinstance(row, dict) else row)
+        if not serializer.is_valid():
+            errors.append((number, json.loads(json.dumps(serializer.errors))))
+            continue
+
+        data = dict(serializer.validated_data, line=number)
+        data['slug'] = data.get('slug') or slugify(data['title'])
+        if is_reserved_slug(serializer_class.Meta.model, data['slug']):
+            errors.append((number, {'slug': [str(ReservedSlugValidator.message)]}))
+            continue
+        # The last row of a duplicated slug wins.
+        valid[data['slug']] = data
+    return list(valid.values()), errors
+
+
+class CatalogImporter:
+    """
+    Import categories and products, keeping the number of created, updated and unchanged rows.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, workers=1):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.stats = {
+            kind: {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []} for kind in ('categories', 'products')
+        }
+        self.category_ids = None
+
+    def run(self, kind, path):
+        """
+        Import the file of `categories` or `products`.
+        """
+        for valid, errors in self.validated_batches(kind, path):
+            self.stats[kind]['errors'] += errors
+            if not valid:
+                continue
+            with transaction.atomic():
+                if kind == 'categories':
+                    self.apply_categories(valid)
+                else:
+                    self.apply_products(valid)
+
+        bump_model_version(Product, Category)
+        if kind == 'categories':
+            # The categories are created by `bulk_create`, without the signals.
+            category_table.invalidate()
+        return self.stats[kind]
+
+    def validated_batches(self, kind, path):
+        batches = read_batches(path, self.batch_size)
+        if self.workers <= 1:
+            for start, rows in batches:
+                yield validate_batch(kind, start, rows)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=setup) as executor:
+            pending = []
+            for start, rows in batches:
+                pending.append(executor.submit(validate_batch, kind, start, rows))
+                # Bound the batches in flight, so the memory does not grow with the file.
+                if len(pending) >= self.workers * 2:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def count(self, kind, created, updated, total):
+        self.stats[kind]['created'] += created
+        self.stats[kind]['updated'] += updated
+        self.stats[kind]['unchanged'] += total - created - updated
+
+    def apply_categories(self, rows):
+        now = timezone.now()
+        existing = {category.slug: category for category in Category.objects.filter(
+            slug__in=[row['slug'] for row in rows]
+        ).only('id', 'slug', 'title')}
+
+        creates = [Category(title=row['title'], slug=row['slug']) for row in rows if row['slug'] not in existing]
+        updates = []
+        for row in rows:
+            category = existing.get(row['slug'])
+            if category is not None and category.title != row['title']:
+                category.title = row['title']
+                category.updated_at = now
+                updates.append(category)
+
+        # A slug created by a concurrent import in the meantime is kept, the unique constraint rejects it.
+        Category.objects.bulk_create(creates, batch_size=self.batch_size, ignore_conflicts=True)
+        Category.objects.bulk_update(updates, ['title', 'updated_at'], batch_size=self.batch_size)
+        self.category_ids = None
+        self.count('categories', len(creates), len(updates), len(rows))
+
+    def get_category_ids(self, slugs):
+        if self.category_ids is None:
+            self.category_ids = {}
+        missing = set(slugs) - set(self.category_ids)
+        if missing:
+            self.category_ids.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+        return self.category_ids
+
+    def apply_products(self, rows):
+        now = timezone.now()
+        existing = {product.slug: product for product in Product.objects.filter(
+            slug__in=[row['slug'] for row in rows]
+        ).only('id', 'slug', *PRODUCT_FIELDS)}
+
+        creates = []
+        updates = []
+        update_fields = {'updated_at'}
+        state_changed = []
+        for row in rows:
+            product = existing.get(row['slug'])
+            if product is None:
+                fields = {field: row[field] for field in PRODUCT_FIELDS if field in row}
+                creates.append(Product(slug=row['slug'], **fields))
+                continue
+
+            changed = [field for field in PRODUCT_FIELDS if field in row and getattr(product, field) != row[field]]
+            if changed:
+                for field in changed:
+                    setattr(product, field, row[field])
+                product.updated_at = now
+                update_fields.update(changed)
+                updates.append(product)
+                if 'is_active' in changed:
+                    state_changed.append(product.id)
+
+        Product.objects.bulk_create(creates, batch_size=self.batch_size, ignore_conflicts=True)
+        Product.objects.bulk_update(updates, sorted(update_fields), batch_size=self.batch_size)
+
+        # SQLite does not return the ids of a bulk insert, the slugs are unique.
+        ids = dict(Product.objects.filter(slug__in=[product.slug for product in creates]).values_list('slug', 'id'))
+        ids.update({slug: product.id for slug, product in existing.items()})
+        relinked, category_ids = self.apply_product_categories(rows, ids)
+        through = Product.categories.through
+        category_ids.update(through.objects.filter(product_id__in=state_changed).values_list('category_id', flat=True))
+        counts.recount_categories(category_ids)
+
+        written = {ids[product.slug] for product in creates + updates}
+        search.index_products(written)
+        # The categories are rendered within the product, so it is touched as modified.
+        Product.objects.filter(pk__in=relinked - written).update(updated_at=now)
+        self.count('products', len(creates), len(written | relinked) - len(creates), len(rows))
+
+    def apply_product_categories(self, rows, ids):
+        """
+        Sync the categories of the products with the rows which have categories.
+
+        :return a tuple with the set of the ids of products and the set of the ids of categories which links changed.
+        """
+        rows = [row for row in rows if 'categories' in row]
+        category_ids = self.get_category_ids({slug for row in rows for slug in row['categories']})
+        for row in rows:
+            unknown = [slug for slug in row['categories'] if slug not in category_ids]
+            if unknown:
+                self.stats['products']['errors'].append(
+                    (row['line'], {'categories': ['Unknown category slugs: {}'.format(', '.join(unknown))]})
+                )
+        wanted = {
+            (ids[row['slug']], category_ids[slug]) for row in rows for slug in row['categories'] if slug in category_ids
+        }
+
+        through = Product.categories.through
+        current = set(through.objects.filter(product_id__in=[ids[row['slug']] for row in rows]).values_list(
+            'product_id', 'category_id'
+        ))
+        removed = current - wanted
+        added = wanted - current
+
+        if removed:
+            removed_ids = through.objects.filter(
+                product_id__in={product_id for product_id, category_id in removed}
+            ).values_list('id', 'product_id', 'category_id')
+            through.objects.filter(pk__in=[pk for pk, *link in removed_ids if tuple(link) in removed]).delete()
+        through.objects.bulk_create([
+            through(product_id=product_id, category_id=category_id) for product_id, category_id in added
+        ], batch_size=self.batch_size)
+
+        changed = removed | added
+        return {product_id for product_id, category_id in changed}, {category_id for product_id, category_id in changed}
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# The names and the expression are frozen here, the migration must not change with `catalog.search`.
+FTS_TABLE = 'catalog_product_fts'
+TSVECTOR_COLUMN = 'search_vector'
+TSVECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(brand, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE {} USING fts5(title, brand, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')".format(FTS_TABLE)
+        )
+        schema_editor.execute(
+            'INSERT INTO {} (rowid, title, brand, description) '
+            'SELECT id, title, brand, description FROM catalog_product'.format(FTS_TABLE)
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE catalog_product ADD COLUMN {} tsvector'.format(TSVECTOR_COLUMN))
+        schema_editor.execute('UPDATE catalog_product SET {} = {}'.format(TSVECTOR_COLUMN, TSVECTOR_SQL))
+        schema_editor.execute(
+            'CREATE INDEX catalog_product_search_idx ON catalog_product USING GIN ({})'.format(TSVECTOR_COLUMN)
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(FTS_TABLE))
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS catalog_product_search_idx')
+        schema_editor.execute('ALTER TABLE catalog_product DROP COLUMN IF EXISTS {}'.format(TSVECTOR_COLUMN))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(is_active=True), fields=['ordering', 'id'], name='product_active_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'ordering'], name='product_brand_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at'], name='product_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+        ),
+        # The auto created through table has no model to declare the index on.
+        migrations.RunSQL(
+            'CREATE INDEX catalog_product_categories_category_product_idx '
+            'ON catalog_product_categories (category_id, product_id)',
+            'DROP INDEX catalog_product_categories_category_product_idx',
+        ),
+    ]
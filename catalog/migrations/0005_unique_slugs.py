@@ -0,0 +1,44 @@
+# Generated by Django 3.0.7 on 2026-10-18 17:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_slugs(apps, schema_editor):
+    """
+    Rename the duplicated slugs with a `-N` suffix, the oldest row keeps the slug, before the unique constraint.
+    """
+    for name in ('Category', 'Product'):
+        model = apps.get_model('catalog', name)
+        duplicates = model.objects.values('slug').annotate(total=Count('id')).filter(total__gt=1)
+        for slug in duplicates.values_list('slug', flat=True):
+            rows = list(model.objects.filter(slug=slug).order_by('id')[1:])
+            taken = set(model.objects.filter(slug__startswith=slug + '-').values_list('slug', flat=True))
+            numb = 1
+            for row in rows:
+                while '%s-%d' % (slug, numb) in taken:
+                    numb += 1
+                row.slug = '%s-%d' % (slug, numb)
+                taken.add(row.slug)
+            model.objects.bulk_update(rows, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(max_length=80, unique=True, verbose_name='slug'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(max_length=80, unique=True, verbose_name='slug'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.0.7 on 2026-10-18 17:38
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    Product = apps.get_model('catalog', 'Product')
+    links = Product.categories.through.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id')
+    total = links.annotate(total=Count('pk')).values('total')
+    active = links.filter(product__is_active=True).annotate(total=Count('pk')).values('total')
+    Category.objects.update(
+        product_count=Coalesce(Subquery(total, output_field=IntegerField()), Value(0)),
+        active_product_count=Coalesce(Subquery(active, output_field=IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='active product count'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='product count'),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
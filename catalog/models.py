@@ -1,32 +1,44 @@
 from django.db import models
-from base.helpers import generate_unique_slug
+from django.db.models import Q
+from django.utils import timezone
+from base.cache import LocalTable, SlugResolver
+from base.models import TrackedFieldsMixin, UniqueSlugMixin
+from . import search
 from django.utils.translation import gettext_lazy as _
 
 
-class Category(models.Model):
+class Category(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=60, verbose_name=_('title'))
-    slug = models.SlugField(blank=False, max_length=80, verbose_name=_('slug'))
+    slug = models.SlugField(blank=False, max_length=80, unique=True, verbose_name=_('slug'))
+    product_count = models.IntegerField(default=0, editable=False, verbose_name=_('product count'))
+    active_product_count = models.IntegerField(default=0, editable=False, verbose_name=_('active product count'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('created at'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('updated at'))
 
-    def save(self, *args, **kwargs):
-        if self.pk is None:  # create
-            if not self.slug:
-                self.slug = generate_unique_slug(Category, self.title)
-        return super().save(*args, **kwargs)
+    # The fixed routes of `catalog.urls` matched before the slug routes.
+    reserved_slugs = ('changes',)
 
     class Meta:
         verbose_name = _('category')
         verbose_name_plural = _('categories')
         ordering = ('title',)
+        indexes = [
+            models.Index(fields=['title', 'id'], name='category_title_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='category_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Product(models.Model):
+# The categories resolved and rendered within the products without a query, see `base.cache.LocalTable`.
+category_table = LocalTable(Category, fields=('id', 'title', 'slug'))
+category_slugs = SlugResolver(Category)
+
+
+class Product(TrackedFieldsMixin, UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=64, verbose_name=_('title'))
-    slug = models.SlugField(max_length=80, verbose_name=_('slug'))
+    slug = models.SlugField(max_length=80, unique=True, verbose_name=_('slug'))
     categories = models.ManyToManyField(Category, related_name='products', blank=True, verbose_name=_('categories'))
     description = models.TextField(verbose_name=_('description'))
     brand = models.CharField(max_length=50, verbose_name=_('brand'))
@@ -35,16 +47,49 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('created at'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('updated at'))
 
+    # The active products are counted in the categories, the slugs are resolved by `product_slugs`.
+    tracked_fields = ('is_active', 'slug')
+    # The fixed routes of `catalog.urls` matched before the slug routes.
+    reserved_slugs = ('bulk', 'changes', 'export', 'facets', 'reorder')
+
     def save(self, *args, **kwargs):
-        if self.pk is None:  # create
-            if not self.slug:
-                self.slug = generate_unique_slug(Product, self.title)
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        search.index_products([self.pk], using=self._state.db)
+        return result
 
     class Meta:
         verbose_name = _('product')
         verbose_name_plural = _('products')
         ordering = ('ordering',)
+        indexes = [
+            models.Index(fields=['ordering', 'id'], name='product_ordering_id_idx'),
+            models.Index(fields=['ordering', 'id'], name='product_active_ordering_idx', condition=Q(is_active=True)),
+            models.Index(fields=['brand', 'ordering'], name='product_brand_ordering_idx'),
+            models.Index(fields=['created_at'], name='product_created_at_idx'),
+            models.Index(fields=['updated_at', 'id'], name='product_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+product_slugs = SlugResolver(Product)
+
+
+class Tombstone(models.Model):
+    """
+    The id of a deleted row, served by the change feed until pruned, see `catalog.changes`.
+    """
+    model = models.CharField(max_length=100, verbose_name=_('model'))
+    object_id = models.IntegerField(verbose_name=_('object id'))
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name=_('deleted at'))
+
+    class Meta:
+        verbose_name = _('tombstone')
+        verbose_name_plural = _('tombstones')
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'object_id'], name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.model, self.object_id)
@@ -0,0 +1,113 @@
+"""
+Reordering of the products by their `ordering` rank, each change written with one statement.
+
+The ranks are spread by `GAP`, so moving a product before or after another one
+updates that product only. When the gap between two neighbours is used up, the
+ranks of every product are spread again.
+"""
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from base.cache import bump_model_version
+from .models import Product
+
+GAP = 1024
+BATCH_SIZE = 500
+
+
+def set_ranks(ranks, using=None):
+    """
+    Write the ranks of the products in one `CASE` based update.
+
+    :param `ranks` is a dict of product id to rank.
+    """
+    if not ranks:
+        return 0
+    return Product.objects.using(using).filter(pk__in=list(ranks)).update(
+        ordering=Case(*[When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()], output_field=IntegerField()),
+        updated_at=timezone.now(),
+    )
+
+
+def set_ranks_in_batches(ranks, using=None):
+    """
+    Write the ranks of the products with one `set_ranks` update per `BATCH_SIZE` products.
+    """
+    ids = list(ranks)
+    return sum(set_ranks({pk: ranks[pk] for pk in ids[index:index + BATCH_SIZE]}, using=using)
+               for index in range(0, len(ids), BATCH_SIZE))
+
+
+def spread_ranks(using=None):
+    """
+    Spread the ranks of every product by `GAP`, keeping their order, with one update per batch of changed products.
+    """
+    rows = Product.objects.using(using).order_by('ordering', 'pk').values_list('pk', 'ordering')
+    ranks = {pk: (index + 1) * GAP for index, (pk, ordering) in enumerate(rows.iterator())
+             if ordering != (index + 1) * GAP}
+    set_ranks_in_batches(ranks, using=using)
+
+
+def get_rank_between(low, high):
+    """
+    Return a rank strictly between the ranks of two neighbours, or `None` when there is no gap.
+    A missing neighbour is given as `None`.
+    """
+    if low is None:
+        return high - GAP
+    if high is None:
+        return low + GAP
+    if high - low >= 2:
+        return (low + high) // 2
+    return None
+
+
+@transaction.atomic
+def reorder_products(ids, using=None):
+    """
+    Reorder the products in the order of the ids, in the ranks they take among the other products.
+
+    :return the number of reordered products.
+    """
+    products = Product.objects.using(using)
+    ranks = sorted(products.filter(pk__in=ids).values_list('ordering', flat=True))
+    if len(ranks) != len(ids):
+        raise Product.DoesNotExist('Some of the products do not exist.')
+    if len(set(ranks)) != len(ranks):
+        # The products with the same rank are ordered by id, the ranks are made unique.
+        spread_ranks(using)
+        ranks = sorted(products.filter(pk__in=ids).values_list('ordering', flat=True))
+
+    updated = set_ranks_in_batches(dict(zip(ids, ranks)), using=using)
+    bump_model_version(Product)
+    return updated
+
+
+@transaction.atomic
+def move_product(pk, before=None, after=None, using=None):
+    """
+    Move the product right before or after another one, updating the moved product only.
+
+    :return the new rank of the product.
+    """
+    others = Product.objects.using(using).exclude(pk=pk)
+    anchor = others.values('pk', 'ordering').get(pk=after if before is None else before)
+    if before is not None:
+        neighbour = others.filter(
+            Q(ordering__lt=anchor['ordering']) | Q(ordering=anchor['ordering'], pk__lt=anchor['pk'])
+        ).order_by('-ordering', '-pk').values_list('ordering', flat=True).first()
+        rank = get_rank_between(neighbour, anchor['ordering'])
+    else:
+        neighbour = others.filter(
+            Q(ordering__gt=anchor['ordering']) | Q(ordering=anchor['ordering'], pk__gt=anchor['pk'])
+        ).order_by('ordering', 'pk').values_list('ordering', flat=True).first()
+        rank = get_rank_between(anchor['ordering'], neighbour)
+
+    if rank is None:
+        spread_ranks(using)
+        return move_product(pk, before=before, after=after, using=using)
+
+    if not set_ranks({pk: rank}, using=using):
+        raise Product.DoesNotExist('The product does not exist.')
+    bump_model_version(Product)
+    return rank
@@ -0,0 +1,139 @@
+"""
+Full-text search of products backed by the text index of the database.
+
+On SQLite the products are indexed in the `catalog_product_fts` FTS5 table,
+on PostgreSQL in the `search_vector` tsvector column with a GIN index, both
+created by the `0003_product_search` migration and kept up to date by
+`Product.save()`.
+"""
+import re
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'catalog_product_fts'
+TSVECTOR_COLUMN = 'search_vector'
+TSVECTOR_CONFIG = 'simple'
+
+# The weight of the title, brand and description columns on the rank.
+WEIGHTS = (10.0, 5.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# The number of ids by statement, below the SQLite limit of variables.
+BATCH_SIZE = 500
+
+
+def is_supported(using='default'):
+    return connections[using].vendor in ('sqlite', 'postgresql')
+
+
+def get_terms(query):
+    """
+    Split the query in terms, dropping the operators of the query syntax.
+    """
+    return TOKEN_RE.findall(query.lower())
+
+
+def index_products(ids, using='default'):
+    """
+    Add or replace the products in the text index.
+
+    :param `ids` is the list of product ids.
+    """
+    ids = list(ids)
+    if not is_supported(using):
+        return
+
+    for index in range(0, len(ids), BATCH_SIZE):
+        _index_products(ids[index:index + BATCH_SIZE], using)
+
+
+def _index_products(ids, using):
+    connection = connections[using]
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), ids)
+            cursor.execute(
+                'INSERT INTO {} (rowid, title, brand, description) '
+                'SELECT id, title, brand, description FROM catalog_product WHERE id IN ({})'.format(
+                    FTS_TABLE, placeholders
+                ),
+                ids,
+            )
+        else:
+            cursor.execute(
+                'UPDATE catalog_product SET {} = {} WHERE id IN ({})'.format(
+                    TSVECTOR_COLUMN, get_tsvector_sql(), placeholders
+                ),
+                ids,
+            )
+
+
+def unindex_products(ids, using='default'):
+    """
+    Remove the products from the text index.
+
+    :param `ids` is the list of product ids.
+    """
+    ids = list(ids)
+    connection = connections[using]
+    if not ids or connection.vendor != 'sqlite':
+        # The tsvector column is removed with the row.
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, ', '.join(['%s'] * len(ids))), ids)
+
+
+def get_tsvector_sql():
+    return ' || '.join(
+        "setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')".format(
+            config=TSVECTOR_CONFIG, column=column, weight=weight
+        ) for column, weight in (('title', 'A'), ('brand', 'B'), ('description', 'C'))
+    )
+
+
+def search(queryset, query):
+    """
+    Filter the products matching every term of the query, the last term as a
+    prefix, annotated with `search_rank` and ordered by relevance. On the databases
+    without a supported text index the terms are matched with `icontains`.
+
+    :param `queryset` is the product queryset.
+    :param `query` is the text typed by the user.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(['"{}"'.format(term) for term in terms[:-1]] + ['"{}"*'.format(terms[-1])])
+        matches = RawSQL('SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE), (match,))
+        rank = RawSQL(
+            'SELECT -bm25({0}, {1}, {2}, {3}) FROM {0} WHERE {0} MATCH %s AND rowid = catalog_product.id'.format(
+                FTS_TABLE, *WEIGHTS
+            ),
+            (match,),
+        )
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(terms[:-1] + ['{}:*'.format(terms[-1])])
+        matches = RawSQL(
+            "SELECT id FROM catalog_product WHERE {} @@ to_tsquery('{}', %s)".format(TSVECTOR_COLUMN, TSVECTOR_CONFIG),
+            (tsquery,),
+        )
+        rank = RawSQL(
+            "ts_rank(catalog_product.{}, to_tsquery('{}', %s))".format(TSVECTOR_COLUMN, TSVECTOR_CONFIG),
+            (tsquery,),
+        )
+    else:
+        # Without a text index every term is matched with `icontains`, unranked.
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(brand__icontains=term) | Q(description__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).order_by('-search_rank', 'pk')
+
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'pk')
@@ -2,35 +2,55 @@ from rest_framework import serializers
 from .models import Category, Product
 from django.utils.translation import gettext_lazy as _
 from rest_framework.validators import UniqueValidator
+from base.helpers import set_related
+from base.serializers import (
+    LocalTableListSerializer, LocalTablePrimaryKeyRelatedField, LocalTableUniqueValidator, ReservedSlugValidator,
+    SparseFieldsetMixin, UniqueSlugSerializerMixin,
+)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(UniqueSlugSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     title = serializers.CharField(required=True, max_length=60, help_text=_('The title of the category.'))
     slug = serializers.SlugField(
-        validators=[UniqueValidator(queryset=Category.objects.all())],
+        validators=[LocalTableUniqueValidator(queryset=Category.objects.all()), ReservedSlugValidator(Category)],
         max_length=150,
         required=False,
         allow_blank=False,
         help_text=_('The slug of the category.')
     )
 
+    product_count = serializers.IntegerField(read_only=True, help_text=_('The number of products of the category.'))
+    active_product_count = serializers.IntegerField(
+        read_only=True, help_text=_('The number of active products of the category.')
+    )
+
     class Meta:
         model = Category
+        fields = ('id', 'title', 'slug', 'product_count', 'active_product_count')
+
+
+class ProductCategorySerializer(CategorySerializer):
+    """
+    A category rendered within the product, without the counts.
+    """
+
+    class Meta(CategorySerializer.Meta):
         fields = ('id', 'title', 'slug')
+        list_serializer_class = LocalTableListSerializer
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(UniqueSlugSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     title = serializers.CharField(required=True, max_length=60, help_text=_('The title of the product.'))
     description = serializers.CharField(required=True, help_text=_('The description of the product.'))
     brand = serializers.CharField(required=True, help_text=_('The brand of the product.'))
     slug = serializers.SlugField(
-        validators=[UniqueValidator(queryset=Category.objects.all())],
+        validators=[UniqueValidator(queryset=Product.objects.all()), ReservedSlugValidator(Product)],
         max_length=150,
         required=False,
         allow_blank=False,
         help_text=_('The slug of the product.')
     )
-    categories = CategorySerializer(many=True, read_only=False)
+    categories = ProductCategorySerializer(many=True, read_only=False)
     is_active = serializers.BooleanField(
         required=False, allow_null=True, help_text=_('The state of the product.')
     )
@@ -44,9 +64,111 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductWriteSerializer(ProductSerializer):
-    categories = serializers.PrimaryKeyRelatedField(
+    categories = LocalTablePrimaryKeyRelatedField(
         required=False,
         queryset=Category.objects.all(),
         many=True,
         read_only=False,
     )
+
+    def create(self, validated_data):
+        categories = validated_data.pop('categories', None)
+        instance = super().create(validated_data)
+        if categories:
+            set_related(instance.categories, categories)
+        return instance
+
+    def update(self, instance, validated_data):
+        categories = validated_data.pop('categories', None)
+        instance = super().update(instance, validated_data)
+        if categories is not None:
+            set_related(instance.categories, categories)
+        return instance
+
+
+class ProductBulkItemSerializer(serializers.ModelSerializer):
+    """
+    A product of a bulk write, the categories and the unique slug are validated for the whole batch.
+    """
+    id = serializers.IntegerField(
+        required=False, help_text=_('The id of the product to update, omit it to create a new product.')
+    )
+    title = serializers.CharField(required=True, max_length=60, help_text=_('The title of the product.'))
+    description = serializers.CharField(required=True, help_text=_('The description of the product.'))
+    brand = serializers.CharField(required=True, help_text=_('The brand of the product.'))
+    slug = serializers.SlugField(
+        max_length=80, required=False, allow_blank=False, validators=[ReservedSlugValidator(Product)],
+        help_text=_('The slug of the product.')
+    )
+    categories = serializers.ListField(
+        child=serializers.IntegerField(), required=False, help_text=_('The ids of the categories of the product.')
+    )
+    is_active = serializers.BooleanField(required=False, help_text=_('The state of the product.'))
+    ordering = serializers.IntegerField(required=False, help_text=_('The order of the product.'))
+
+    class Meta:
+        model = Product
+        fields = ('id', 'title', 'slug', 'description', 'brand', 'categories', 'is_active', 'ordering')
+
+
+class ProductBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, help_text=_('The ids of the products to delete.')
+    )
+
+    def validate_ids(self, value):
+        max_items = self.context.get('max_items')
+        if max_items is not None and len(value) > max_items:
+            raise serializers.ValidationError(_('Ensure this list has no more than {max} items.').format(max=max_items))
+        return value
+
+
+class ProductReorderSerializer(serializers.Serializer):
+    """
+    The new order of the products, as the list of `ids` or the `id` to move `before` or `after` another product.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False,
+        help_text=_('The ids of the products in their new order.')
+    )
+    id = serializers.IntegerField(required=False, help_text=_('The id of the product to move.'))
+    before = serializers.IntegerField(required=False, help_text=_('The id of the product to move before.'))
+    after = serializers.IntegerField(required=False, help_text=_('The id of the product to move after.'))
+
+    def validate(self, attrs):
+        if 'ids' in attrs:
+            if set(attrs) != {'ids'}:
+                raise serializers.ValidationError(_('Send either the `ids` or the `id` to move.'))
+            if len(set(attrs['ids'])) != len(attrs['ids']):
+                raise serializers.ValidationError({'ids': _('The ids must be unique.')})
+            return attrs
+
+        if 'id' not in attrs or ('before' in attrs) == ('after' in attrs):
+            raise serializers.ValidationError(
+                _('Send the `ids` in their new order, or the `id` to move with either `before` or `after`.')
+            )
+        if attrs['id'] == attrs.get('before', attrs.get('after')):
+            raise serializers.ValidationError(_('A product can not be moved next to itself.'))
+        return attrs
+
+
+class CategoryImportSerializer(serializers.ModelSerializer):
+    """
+    A category of an import file, matched to the existing categories by slug.
+    """
+    title = serializers.CharField(required=True, max_length=60)
+    slug = serializers.SlugField(required=False, max_length=80, validators=[ReservedSlugValidator(Category)])
+
+    class Meta:
+        model = Category
+        fields = ('title', 'slug')
+
+
+class ProductImportSerializer(ProductBulkItemSerializer):
+    """
+    A product of an import file, matched to the existing products by slug, with the categories by slug.
+    """
+    categories = serializers.ListField(child=serializers.SlugField(), required=False)
+
+    class Meta(ProductBulkItemSerializer.Meta):
+        fields = ('title', 'slug', 'description', 'brand', 'categories', 'is_active', 'ordering')
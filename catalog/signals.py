@@ -0,0 +1,85 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from base.cache import bump_model_version
+from .models import Category, Product, Tombstone, category_slugs, category_table, product_slugs
+from . import counts, search
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, using, **kwargs):
+    # Products render their categories, so both are invalidated.
+    bump_model_version(Category, Product)
+    category_table.invalidate(using)
+    category_slugs.invalidate(using)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def catalog_deleted(sender, instance, using, **kwargs):
+    # The change feed serves the deleted ids from the tombstones.
+    Tombstone.objects.using(using).create(model=sender._meta.label_lower, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, **kwargs):
+    bump_model_version(Product)
+
+
+@receiver(post_save, sender=Product)
+def product_slug_changed(sender, instance, created, using, **kwargs):
+    if not created and instance.has_changed('slug'):
+        product_slugs.invalidate(using)
+
+
+@receiver(post_save, sender=Product)
+def product_state_changed(sender, instance, created, using, **kwargs):
+    if created or not instance.has_changed('is_active'):
+        return
+    category_ids = sender.categories.through.objects.using(using).filter(product_id=instance.pk).values('category_id')
+    counts.adjust_counts(category_ids, active=1 if instance.is_active else -1, using=using)
+    bump_model_version(Category)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, using, **kwargs):
+    # The links are deleted with the product, without `m2m_changed`.
+    links = sender.categories.through.objects.using(using).filter(product_id=instance.pk)
+    instance._category_ids = list(links.values_list('category_id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, using, **kwargs):
+    search.unindex_products([instance.pk], using=using)
+    product_slugs.invalidate(using)
+    category_ids = instance.__dict__.pop('_category_ids', [])
+    if category_ids:
+        counts.adjust_counts(category_ids, total=-1, active=-1 if instance.is_active else 0, using=using)
+        bump_model_version(Category)
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # Keep the links which are removed, `pk_set` may have ids which are not linked.
+        links = sender.objects.using(using).filter(**{'category_id' if reverse else 'product_id': instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{'product_id__in' if reverse else 'category_id__in': pk_set})
+        instance._removed_links = list(links.values_list('product_id', 'category_id'))
+    if not action.startswith('post_'):
+        return
+
+    if action == 'post_add':
+        links = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set or []]
+        counts.apply_links(links, using=using)
+    else:
+        links = instance.__dict__.pop('_removed_links', [])
+        counts.apply_links(links, sign=-1, using=using)
+
+    # The categories are rendered within the product, so it is touched as modified.
+    product_ids = {product_id for product_id, category_id in links}
+    Product.objects.using(using).filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+    bump_model_version(Product, Category)
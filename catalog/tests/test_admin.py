@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from catalog.models import Category, Product
+from catalog.factories import CategoryFactory, ProductFactory
+from user.factories import UserFactory
+
+
+class ProductAdminTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+        self.url = reverse('admin:catalog_product_changelist')
+
+    def test_changelist_product(self):
+        """
+        Ensure the changelist counts the products once, without the distinct titles filter, and searches the index.
+        """
+        ProductFactory.create(title='Red runner')
+        ProductFactory.create(title='Blue walker')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse(response.context['cl'].show_full_result_count)
+
+        response = self.client.get(self.url, {'q': 'runn'})
+        self.assertEqual([product.title for product in response.context['cl'].result_list], ['Red runner'])
+
+    def test_change_product_categories_autocomplete(self):
+        """
+        Ensure the categories of the product form are not loaded as choices.
+        """
+        CategoryFactory.create_batch(3)
+        product = ProductFactory.create()
+
+        response = self.client.get(reverse('admin:catalog_product_change', args=[product.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, '<option value="{}"'.format(Category.objects.first().pk))
+
+    def test_deactivate_products(self):
+        """
+        Ensure the selected products are deactivated in one update, with the counts of their categories.
+        """
+        category = CategoryFactory.create()
+        products = ProductFactory.create_batch(3, is_active=True, categories=[category])
+
+        data = {'action': 'deactivate_products', '_selected_action': [product.pk for product in products[:2]]}
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(Product.objects.filter(is_active=True).count(), 1)
+        category.refresh_from_db()
+        self.assertEqual((category.product_count, category.active_product_count), (3, 1))
+
+    def test_reassign_category(self):
+        """
+        Ensure the selected products are moved to the category, with the counts of both categories.
+        """
+        first, second = CategoryFactory.create_batch(2)
+        products = ProductFactory.create_batch(2, categories=[first])
+
+        data = {
+            'action': 'reassign_category',
+            'category': second.pk,
+            '_selected_action': [product.pk for product in products],
+        }
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+
+        for product in products:
+            self.assertEqual(list(product.categories.all()), [second])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.product_count, second.product_count), (0, 2))
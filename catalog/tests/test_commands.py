@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from catalog.models import Category, Product
+from catalog.factories import CategoryFactory, ProductFactory
+
+
+class ImportCatalogTests(TestCase):
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_import_catalog(self):
+        """
+        Ensure we can import categories and products, creating or updating them by slug.
+        """
+        category = CategoryFactory.create(slug='shoes')
+        instance = ProductFactory.create(slug='runner', title='Runner', is_active=True, categories=[category])
+        unchanged = ProductFactory.create(slug='walker', title='Walker', description='Same.', brand='Acme',
+                                          is_active=True, ordering=1)
+
+        categories = self.write('categories.csv', 'title,slug\nShoes,shoes\nBoots,boots\n')
+        products = self.write('products.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'title': 'Runner v2', 'slug': 'runner', 'description': instance.description, 'brand': instance.brand,
+             'categories': ['boots']},
+            {'title': 'Walker', 'slug': 'walker', 'description': 'Same.', 'brand': 'Acme', 'is_active': True,
+             'ordering': 1},
+            {'title': 'Hiker', 'description': 'New.', 'brand': 'Acme', 'categories': [{'slug': 'shoes'}]},
+            {'title': 'Invalid'},
+        ]))
+
+        out = StringIO()
+        call_command('importcatalog', categories=categories, products=products, batch_size=2, stdout=out)
+
+        self.assertIn('1 created, 1 updated, 0 unchanged', out.getvalue())
+        self.assertIn('1 created, 1 updated, 1 unchanged', out.getvalue())
+        self.assertIn('Row 4', out.getvalue())
+        self.assertEqual(Category.objects.get(slug='shoes').title, 'Shoes')
+
+        instance.refresh_from_db()
+        self.assertEqual(instance.title, 'Runner v2')
+        self.assertEqual(list(instance.categories.values_list('slug', flat=True)), ['boots'])
+        self.assertEqual(list(Product.objects.get(slug='hiker').categories.values_list('slug', flat=True)), ['shoes'])
+        self.assertEqual(Product.objects.get(pk=unchanged.pk).updated_at, unchanged.updated_at)
+        self.assertEqual(
+            set(Category.objects.values_list('slug', 'product_count', 'active_product_count')),
+            {('shoes', 1, 1), ('boots', 1, 1)}
+        )
+
+
+class ReconcileCategoryCountsTests(TestCase):
+    def test_reconcile_category_counts(self):
+        """
+        Ensure the drifted product counts of the categories are repaired.
+        """
+        category, other = CategoryFactory.create_batch(2)
+        ProductFactory.create(is_active=True, categories=[category])
+        ProductFactory.create(is_active=False, categories=[category])
+        Category.objects.filter(pk=category.pk).update(product_count=5, active_product_count=0)
+
+        out = StringIO()
+        call_command('reconcilecategorycounts', dry_run=True, stdout=out)
+        self.assertIn('Drifted categories: 1', out.getvalue())
+        self.assertEqual(Category.objects.get(pk=category.pk).product_count, 5)
+
+        out = StringIO()
+        call_command('reconcilecategorycounts', stdout=out)
+        self.assertIn('{}: 0/5 products, expected 1/2'.format(category.slug), out.getvalue())
+        self.assertIn('Repaired categories: 1', out.getvalue())
+        self.assertEqual(
+            list(Category.objects.order_by('pk').values_list('product_count', 'active_product_count')),
+            [(2, 1), (0, 0)]
+        )
@@ -0,0 +1,66 @@
+import json
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from catalog.models import Category, Product
+from catalog.factories import CategoryFactory, ProductFactory
+from catalog.serializers import CategorySerializer, ProductSerializer
+from base.serializers import compile_serializer
+
+
+class CompiledSerializerTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        categories = CategoryFactory.create_batch(4)
+        ProductFactory.create_batch(3, categories=categories[:2])
+        ProductFactory.create_batch(2, categories=categories[1:])
+        ProductFactory.create_batch(2)
+
+    def render(self, serializer_class, queryset, fields=None):
+        compiled = compile_serializer(serializer_class, fields)
+        return compiled.render(queryset.values(*compiled.columns))
+
+    def assertParity(self, compiled, expected):
+        self.assertEqual(json.dumps(compiled), json.dumps(expected))
+
+    def test_category_parity(self):
+        """
+        Ensure the compiled category serializer renders the same output of the serializer.
+        """
+        queryset = Category.objects.all()
+
+        self.assertParity(self.render(CategorySerializer, queryset), CategorySerializer(queryset, many=True).data)
+
+    def test_product_parity(self):
+        """
+        Ensure the compiled product serializer renders the same output, with the nested categories.
+        """
+        queryset = Product.objects.order_by('ordering', 'id')
+
+        self.assertParity(
+            self.render(ProductSerializer, queryset),
+            ProductSerializer(queryset.prefetch_related('categories'), many=True).data
+        )
+
+    def test_product_sparse_parity(self):
+        """
+        Ensure the compiled product serializer renders the same output with sparse fields.
+        """
+        queryset = Product.objects.order_by('ordering', 'id')
+        fields = ('id', 'title', 'is_active')
+
+        self.assertParity(
+            self.render(ProductSerializer, queryset, fields),
+            ProductSerializer(queryset, many=True, fields=fields).data
+        )
+
+    def test_product_list_parity(self):
+        """
+        Ensure the product list renders the same results of the serializer.
+        """
+        url = reverse('catalog:product-list')
+
+        response = self.client.get(url, data={'page_size': 50}, format='json')
+
+        queryset = Product.objects.order_by('ordering', 'id').prefetch_related('categories')
+        self.assertParity(response.data['results'], ProductSerializer(queryset, many=True).data)
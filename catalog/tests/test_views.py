@@ -1,14 +1,39 @@
+import csv
+import gzip
+import io
+import json
+import msgpack
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, close_old_connections, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from catalog.models import Category
+from catalog.models import Category, Product, Tombstone, category_table, product_slugs
 from catalog.factories import CategoryFactory, ProductFactory
+from catalog import autocomplete, changes, ordering, search
+from catalog.views import ProductViewSet
 from user.factories import UserFactory
 from base.factories import AccessTokenFactory
+from base.cache import has_recent_writes
+from base.db import STICKY_COOKIE, ReplicaRouter, read_from, replicas
+from base.pagination import KeysetPagination
+from base.serializers import LocalTableUniqueValidator
+from base.helpers import generate_unique_slug, generate_unique_slugs, get_taken_slugs
+from core.asgi import application
 
 
 class CategoryTests(APITestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.user = UserFactory()
         self.keys = ['id', 'title', 'slug']
         self.headers = {
@@ -75,9 +100,226 @@ class CategoryTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_create_category_unique_slug(self):
+        """
+        Ensure the slug of a duplicated title is generated with one query.
+        """
+        CategoryFactory.create(title='Foo bar')
+        CategoryFactory.create(title='Foo bar', slug='foo-bar-1')
+        CategoryFactory.create(title='Foo bar baz')
+
+        with CaptureQueriesContext(connection) as queries:
+            slug = generate_unique_slug(Category, 'Foo bar')
+
+        self.assertEqual(slug, 'foo-bar-2')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(get_taken_slugs(Category, ['foo-bar']), {'foo-bar', 'foo-bar-1'})
+
+    def test_create_category_reserved_slug(self):
+        """
+        Ensure the words of the fixed routes and the digits are never a category slug, so its slug route is reachable.
+        """
+        url = reverse('catalog:category-list')
+
+        response = self.client.post(url, data={'title': 'Changes'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['slug'], 'changes-1')
+        response = self.client.get(reverse('catalog:category-detail-slug', kwargs={'slug': 'changes-1'}))
+        self.assertEqual(response.data['title'], 'Changes')
+
+        response = self.client.post(url, data={'title': 'Other', 'slug': 'changes'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['slug'][0].code, 'reserved')
+
+        # A slug of only digits would be routed as a pk.
+        response = self.client.post(url, data={'title': '2024'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['slug'], '2024-1')
+        self.assertEqual(generate_unique_slugs(Category, ['2024', '2024']), ['2024-2', '2024-3'])
+        response = self.client.post(url, data={'title': 'Other', 'slug': '2024'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['slug'][0].code, 'reserved')
+
+    def test_create_category_unique_slugs_batches(self):
+        """
+        Ensure the slugs of more distinct titles than a batch are generated in batches.
+        """
+        CategoryFactory.create(title='Title 1')
+        titles = ['Title %d' % index for index in range(600)]
+
+        with CaptureQueriesContext(connection) as queries:
+            slugs = generate_unique_slugs(Category, titles)
+
+        self.assertEqual(slugs[:3], ['title-0', 'title-1-1', 'title-2'])
+        self.assertEqual(len(set(slugs)), 600)
+        self.assertEqual(len(queries), 3)
+
+    def test_create_category_slug_behind_table(self):
+        """
+        Ensure a slug written behind the copy of the worker is rejected, by the validator or by the constraint.
+        """
+        url = reverse('catalog:category-list')
+        category_table.get_rows()
+        Category.objects.bulk_create([Category(title='Other', slug='other')])
+
+        response = self.client.post(url, data={'title': 'Foo', 'slug': 'other'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['slug'][0].code, 'unique')
+
+        with mock.patch.object(LocalTableUniqueValidator, '__call__', return_value=None):
+            response = self.client.post(url, data={'title': 'Foo', 'slug': 'other'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['slug'][0].code, 'unique')
+
+    def test_create_category_slug_conflict(self):
+        """
+        Ensure the insert is retried with a new slug when a concurrent create takes it.
+        """
+        CategoryFactory.create(title='Foo bar')
+
+        with mock.patch('base.models.generate_unique_slug', side_effect=['foo-bar', 'foo-bar-1']):
+            instance = Category.objects.create(title='Foo bar')
+
+        self.assertEqual(instance.slug, 'foo-bar-1')
+
+    def test_list_category_table(self):
+        """
+        Ensure the categories are listed and validated from the copy of the worker, kept current by the signals.
+        """
+        url = reverse('catalog:category-list')
+        CategoryFactory.create_batch(2)
+        category_table.get_rows()
+
+        # Only the validators of the conditional get are queried.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'fields': 'id,title,slug'}, format='json')
+        self.assertEqual(response.data['total'], 2)
+
+        response = self.client.post(url, data={'title': 'Foo Bar'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(url, {'fields': 'id,title,slug'}, format='json')
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(
+            [item['title'] for item in response.data['results']],
+            list(Category.objects.values_list('title', flat=True))
+        )
+
+        response = self.client.post(url, data={'title': 'Foo', 'slug': 'foo-bar'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['slug'][0].code, 'unique')
+
+        # A row written by another worker, with a cache not shared, is loaded after the maximum age.
+        Category.objects.bulk_create([Category(title='Other', slug='other')])
+        self.assertNotIn('other', [row['slug'] for row in category_table.get_rows().values()])
+        with mock.patch.object(category_table, 'max_age', 0):
+            self.assertIn('other', [row['slug'] for row in category_table.get_rows().values()])
+
+    def test_list_category_product_counts(self):
+        """
+        Ensure the product counts of the categories are kept current by the changes of the products.
+        """
+        url = reverse('catalog:category-list')
+        first, second = CategoryFactory.create_batch(2)
+        active = ProductFactory.create(is_active=True, categories=[first, second])
+        inactive = ProductFactory.create(is_active=False, categories=[first])
+
+        def assertCounts(category, total, active_total):
+            category.refresh_from_db()
+            self.assertEqual((category.product_count, category.active_product_count), (total, active_total))
+
+        assertCounts(first, 2, 1)
+        assertCounts(second, 1, 1)
+
+        inactive.is_active = True
+        inactive.save()
+        assertCounts(first, 2, 2)
+
+        active.categories.remove(first, CategoryFactory.create())
+        assertCounts(first, 1, 1)
+        second.products.add(inactive)
+        assertCounts(second, 2, 2)
+
+        inactive.delete()
+        assertCounts(first, 0, 0)
+        assertCounts(second, 1, 1)
+
+        second.products.clear()
+        assertCounts(second, 0, 0)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(url, format='json')
+        self.assertEqual(
+            [(item['product_count'], item['active_product_count']) for item in response.data['results']], [(0, 0)] * 3
+        )
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_list_category_replica(self):
+        """
+        Ensure the categories are read from a replica, except after a write or when the replica fails.
+        """
+        url = reverse('catalog:category-list')
+        CategoryFactory.create_batch(2)
+        cache.clear()
+
+        with mock.patch('base.mixins.read_from', wraps=read_from) as replica_read:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        replica_read.assert_called_once_with('default', (Category,))
+
+        response = self.client.post(url, data={'title': 'Foo Bar'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        with mock.patch('base.mixins.read_from', wraps=read_from) as replica_read:
+            response = self.client.get(url, format='json')
+            self.client.cookies.pop(STICKY_COOKIE)
+            self.client.get(url, format='json')
+        self.assertEqual(response.data['total'], 3)
+        replica_read.assert_not_called()
+
+        cache.clear()
+        with mock.patch('base.mixins.read_from', side_effect=OperationalError('replica down')), \
+                self.assertLogs('base.db', 'WARNING'):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('default', replicas.failed)
+        self.assertIsNone(replicas.choose())
+        replicas.failed.clear()
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_replica_recent_writes(self):
+        """
+        Ensure the writes of the models without a cache version also send their reads to the primary.
+        """
+        group = Group.objects.create(name='Foo')
+        cache.clear()
+        self.user.save()
+        self.assertTrue(has_recent_writes(get_user_model()))
+        self.assertFalse(has_recent_writes(Group))
+
+        group.permissions.add(*Permission.objects.all()[:1])
+        self.assertTrue(has_recent_writes(Group))
+
+    def test_replica_router(self):
+        """
+        Ensure the router reads the models from the replica until the first write.
+        """
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Category))
+        with read_from('replica1', [Product]):
+            self.assertEqual(router.db_for_read(Product), 'replica1')
+            self.assertEqual(router.db_for_read(Product.categories.through), 'replica1')
+            self.assertIsNone(router.db_for_read(Category))
+            router.db_for_write(Product)
+            self.assertIsNone(router.db_for_read(Product))
+        with override_settings(REPLICA_DATABASES=['replica1']):
+            self.assertFalse(router.allow_migrate('replica1', 'catalog'))
+            self.assertIsNone(router.allow_migrate('default', 'catalog'))
+
 
 class ProductTests(APITestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.user = UserFactory()
         self.keys = ['id', 'title', 'slug', 'description', 'brand', 'is_active', 'ordering']
         self.headers = {
@@ -105,6 +347,341 @@ class ProductTests(APITestCase):
         for key in mock.keys():
             self.assertEqual(response.data[key], data[key])
 
+    def test_create_product_category_table(self):
+        """
+        Ensure the categories of a product write are resolved and rendered without a category query.
+        """
+        url = reverse('catalog:product-list')
+        categories = CategoryFactory.create_batch(20)
+        data = {key: ProductFactory.build().__dict__[key] for key in ['title', 'description', 'brand']}
+        data['categories'] = [category.id for category in categories]
+        category_table.get_rows()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data=data, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [category['title'] for category in response.data['categories']],
+            sorted(category.title for category in categories)
+        )
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and '"catalog_category"' in query['sql']
+        ])
+
+        data['categories'] = [categories[0].id, 0]
+        response = self.client.post(url, data=data, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['categories'][0].code, 'does_not_exist')
+
+        # A category written behind the copy, eg: by another worker, is looked up in the database.
+        Category.objects.bulk_create([Category(title='Other', slug='other')])
+        data['categories'] = [Category.objects.get(slug='other').id]
+        response = self.client.post(url, data=data, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([category['slug'] for category in response.data['categories']], ['other'])
+
+    def test_list_product_query_budget(self):
+        """
+        Ensure the product list costs the same number of queries regardless of the page length.
+        """
+        url = reverse('catalog:product-list')
+        categories = CategoryFactory.create_batch(3)
+
+        ProductFactory.create_batch(2, categories=categories)
+        # The categories are rendered from the copy of the worker, loaded once.
+        category_table.get_rows()
+        with self.assertNumQueries(ProductViewSet.query_budget['list']):
+            response = self.client.get(url, format='json')
+        self.assertEqual(len(response.data['results']), 2)
+
+        ProductFactory.create_batch(20, categories=categories)
+        with self.assertNumQueries(ProductViewSet.query_budget['list']):
+            response = self.client.get(url, format='json')
+        self.assertEqual(len(response.data['results']), 15)
+
+        for item in response.data['results']:
+            self.assertEqual(len(item['categories']), 3)
+
+    def test_retrieve_product_query_budget(self):
+        """
+        Ensure the product detail, with its categories from the copy of the worker, stays within the query budget.
+        """
+        instance = ProductFactory.create(categories=CategoryFactory.create_batch(5))
+        url = reverse('catalog:product-detail', kwargs={'pk': instance.id})
+        # Like the list, the copy of the worker is loaded once, not by each request.
+        category_table.get_rows()
+
+        with self.assertNoLogs('base.mixins', 'WARNING'), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(len(response.data['categories']), 5)
+        self.assertLessEqual(len(queries), ProductViewSet.query_budget['retrieve'])
+
+    def test_list_product_cached_total(self):
+        """
+        Ensure the total is cached and invalidated when a product changes.
+        """
+        url = reverse('catalog:product-list')
+        ProductFactory.create_batch(2)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['total'], 2)
+        self.assertTrue(response.data['total_exact'])
+
+        with self.assertNumQueries(ProductViewSet.query_budget['list'] - 1):
+            response = self.client.get(url, data={'page': 1}, format='json')
+        self.assertEqual(response.data['total'], 2)
+
+        ProductFactory.create()
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['total'], 3)
+
+    def test_list_product_request_log(self):
+        """
+        Ensure the request is logged in a compact line, with the body only when it is sampled.
+        """
+        url = reverse('catalog:product-list')
+        ProductFactory.create()
+
+        with self.assertLogs('base.requests', level='INFO') as logs:
+            response = self.client.get(url, format='json', HTTP_X_REQUEST_ID='abc123')
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+        self.assertEqual(len(logs.records), 1)
+        self.assertRegex(logs.output[0], r'abc123 GET /catalog/products 200 [\d.]+ms \d+ queries')
+
+        with self.settings(REQUEST_LOG_BODY_SAMPLE_RATE=1), self.assertLogs('base.requests', level='INFO') as logs:
+            self.client.get(url, data={'page': 1}, format='json')
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('body:', logs.output[1])
+
+    def test_list_product_cached_response(self):
+        """
+        Ensure the product list is served from cache until a product changes.
+        """
+        url = reverse('catalog:product-list')
+        instance = ProductFactory.create()
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['title'], instance.title)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        instance.title = 'Changed title'
+        instance.save()
+        response = self.client.get(url, format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Changed title')
+
+        response = self.client.get(url, format='json', HTTP_ACCEPT_LANGUAGE='pt-br')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_list_product_asgi_fast_path(self):
+        """
+        Ensure the ASGI fast path sends the stored rendered response, without queries, until a product changes.
+        """
+        # The requests run within the transaction of the test, like the test client does.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+        def get(*headers, scheme='http', host=b'localhost'):
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            async_to_sync(application)({
+                'type': 'http', 'method': 'GET', 'scheme': scheme, 'path': reverse('catalog:product-list'),
+                'query_string': b'', 'headers': [(b'host', host), (b'accept', b'application/json')] + list(headers),
+            }, receive, send)
+            return messages[0]['status'], dict(messages[0]['headers']), b''.join(
+                message.get('body', b'') for message in messages[1:]
+            )
+
+        instance = ProductFactory.create()
+        status_code, headers, body = get()
+        self.assertEqual((status_code, headers[b'X-Cache']), (200, b'MISS'))
+
+        with self.assertNumQueries(0):
+            status_code, headers, cached = get()
+        self.assertEqual((status_code, headers[b'X-Cache'], cached), (200, b'HIT', body))
+
+        status_code, headers, cached = get((b'if-none-match', headers[b'ETag']))
+        self.assertEqual((status_code, cached), (304, b''))
+
+        # The absolute URLs of a response depend on the scheme and the host, which are part of the key.
+        for origin in ({'scheme': 'https'}, {'host': b'127.0.0.1'}):
+            status_code, headers, cached = get(**origin)
+            self.assertEqual((status_code, headers[b'X-Cache']), (200, b'MISS'))
+
+        instance.title = 'Changed title'
+        instance.save()
+        status_code, headers, body = get()
+        self.assertEqual(headers[b'X-Cache'], b'MISS')
+        self.assertIn(b'Changed title', body)
+
+    def test_list_product_sparse_fields(self):
+        """
+        Ensure we can select the fields of the product list, loading only their columns.
+        """
+        url = reverse('catalog:product-list')
+        ProductFactory.create_batch(3, categories=CategoryFactory.create_batch(2))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data={'fields': 'id,title,slug'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data['results']:
+            self.assertEqual(set(item), {'id', 'title', 'slug'})
+        self.assertEqual(len(context), ProductViewSet.query_budget['list'] - 1)
+        self.assertNotIn('description', context.captured_queries[-1]['sql'])
+
+    def test_search_product(self):
+        """
+        Ensure we can search products by title, brand and description ranked by relevance.
+        """
+        url = reverse('catalog:product-list')
+        by_title = ProductFactory.create(title='Wireless keyboard', brand='Acme', description='A device.')
+        by_description = ProductFactory.create(title='Mouse', brand='Acme', description='Pairs with the keyboard.')
+        ProductFactory.create(title='Monitor', brand='Other', description='A screen.')
+
+        response = self.client.get(url, data={'q': 'keyboard'}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [by_title.id, by_description.id])
+        self.assertEqual(response.data['total'], 2)
+
+        response = self.client.get(url, data={'q': 'acme mou'}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [by_description.id])
+
+        by_description.description = 'Wireless.'
+        by_description.save()
+        response = self.client.get(url, data={'q': 'keyboard'}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [by_title.id])
+
+        by_title.delete()
+        response = self.client.get(url, data={'q': 'wireless'}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [by_description.id])
+
+        # Without a supported text index the terms are matched with `icontains`.
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            response = self.client.get(url, data={'q': 'acme WIRE'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [by_description.id])
+
+    def test_filter_product(self):
+        """
+        Ensure we can filter products by categories, brand and state.
+        """
+        url = reverse('catalog:product-list')
+        category, other = CategoryFactory.create_batch(2)
+        active = ProductFactory.create(brand='Acme', is_active=True, categories=[category, other])
+        ProductFactory.create(brand='Acme', is_active=False, categories=[category])
+        ProductFactory.create(brand='Other', is_active=True, categories=[other])
+
+        response = self.client.get(url, data={
+            'categories': '{},{}'.format(category.id, other.id), 'brand': 'Acme', 'is_active': 'true'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [active.id])
+
+        response = self.client.get(url, data={'updated_at_after': 'invalid'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_product_not_modified(self):
+        """
+        Ensure a product is not sent again while it and its categories are not modified.
+        """
+        category = CategoryFactory.create()
+        instance = ProductFactory.create(categories=[category])
+        url = reverse('catalog:product-detail', kwargs={'pk': instance.id})
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        category.title = 'Changed title'
+        category.save()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['categories'][0]['title'], 'Changed title')
+
+    def test_list_product_cursor(self):
+        """
+        Ensure we can walk the product list by cursor when rows share the same ordering.
+        """
+        products = ProductFactory.create_batch(20, ordering=1) + ProductFactory.create_batch(20, ordering=2)
+        expected = [product.id for product in sorted(products, key=lambda product: (product.ordering, product.id))]
+
+        url = reverse('catalog:product-list') + '?cursor='
+        seen = []
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('total', response.data)
+            seen += [item['id'] for item in response.data['results']]
+            last, url = url, response.data['links']['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(last, format='json')
+        response = self.client.get(response.data['links']['previous'], format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], expected[15:30])
+
+    def test_list_product_invalid_cursor(self):
+        """
+        Ensure an invalid cursor is rejected.
+        """
+        url = reverse('catalog:product-list')
+        pagination = KeysetPagination()
+
+        for cursor in ('invalid', pagination.encode_cursor(['abc', 1]), pagination.encode_cursor([{'a': 1}, 1]),
+                       pagination.encode_cursor([None, 1])):
+            response = self.client.get(url, data={'cursor': cursor}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_product_msgpack(self):
+        """
+        Ensure we can create a product with a MessagePack payload and negotiate a MessagePack response.
+        """
+        url = reverse('catalog:product-list')
+        data = {key: ProductFactory.build().__dict__[key] for key in [
+            'title', 'slug', 'description', 'brand', 'is_active', 'ordering'
+        ]}
+
+        response = self.client.post(url, data=data, format='msgpack', HTTP_ACCEPT='application/msgpack',
+                                    **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        content = msgpack.unpackb(response.content, raw=False)
+        for key in data.keys():
+            self.assertEqual(content[key], data[key])
+
+    def test_list_product_msgpack(self):
+        """
+        Ensure the product list renders the same data as MessagePack and JSON.
+        """
+        url = reverse('catalog:product-list')
+        ProductFactory.create_batch(3, categories=CategoryFactory.create_batch(2))
+
+        response = self.client.get(url, data={'format': 'msgpack'})
+        content = msgpack.unpackb(response.content, raw=False)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, json.loads(self.client.get(url, format='json').content))
+
     def test_retrieve_product(self):
         """
         Ensure we can retrieve a product object.
@@ -124,6 +701,29 @@ class ProductTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_retrieve_product_slug(self):
+        """
+        Ensure a product is retrieved by slug with the queries of the lookup by pk, following the slug changes.
+        """
+        instance = ProductFactory.create(slug='red-runner', categories=CategoryFactory.create_batch(2))
+        url = reverse('catalog:product-detail-slug', kwargs={'slug': 'red-runner'})
+        category_table.get_rows()
+        product_slugs.resolve('red-runner')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('catalog:product-detail', kwargs={'pk': instance.id}), format='json')
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], instance.id)
+
+        response = self.client.patch(url, data={'slug': 'blue-runner'}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('catalog:product-detail-slug', kwargs={'slug': 'blue-runner'}))
+        self.assertEqual(response.data['id'], instance.id)
+
     def test_update_product(self):
         """
         Ensure we can update a product object.
@@ -161,3 +761,286 @@ class ProductTests(APITestCase):
         response = self.client.delete(url, format='json', **self.headers)
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_write_product(self):
+        """
+        Ensure we can create and update a batch of products in one request.
+        """
+        url = reverse('catalog:product-bulk')
+        categories = [category.id for category in CategoryFactory.create_batch(2)]
+        instance = ProductFactory.create(title='Existing', slug='same-title')
+        description = instance.description
+        data = [
+            {'title': 'Same title', 'description': 'First.', 'brand': 'Acme', 'categories': categories},
+            {'title': 'Same title', 'description': 'Second.', 'brand': 'Acme'},
+            {'id': instance.id, 'title': 'Updated', 'categories': categories[:1]},
+        ]
+
+        response = self.client.post(url, data=data, format='json', **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(response.data['updated'], [instance.id])
+
+        first, second = [Product.objects.get(pk=pk) for pk in response.data['created']]
+        self.assertEqual((first.slug, second.slug), ('same-title-1', 'same-title-2'))
+        self.assertEqual(sorted(first.categories.values_list('id', flat=True)), sorted(categories))
+
+        instance.refresh_from_db()
+        self.assertEqual(instance.title, 'Updated')
+        self.assertEqual(instance.description, description)
+        self.assertEqual(list(instance.categories.values_list('id', flat=True)), categories[:1])
+        self.assertEqual(
+            list(Category.objects.filter(pk__in=categories).order_by('pk').values_list('product_count', flat=True)),
+            [2, 1]
+        )
+
+        response = self.client.get(reverse('catalog:product-list'), data={'q': 'updated'}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [instance.id])
+
+    def test_bulk_write_product_errors(self):
+        """
+        Ensure a batch with invalid products reports the errors by index and writes nothing.
+        """
+        url = reverse('catalog:product-bulk')
+        data = [
+            {'title': 'Valid', 'description': 'Valid.', 'brand': 'Acme'},
+            {'title': 'Invalid', 'description': 'Invalid.', 'brand': 'Acme', 'categories': [0]},
+            {'id': 0, 'title': 'Missing'},
+            {'description': 'Without title.', 'brand': 'Acme'},
+        ]
+
+        response = self.client.post(url, data=data, format='json', **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(response.data['errors']), [1, 2, 3])
+        self.assertIn('categories', response.data['errors'][1])
+        self.assertIn('id', response.data['errors'][2])
+        self.assertIn('title', response.data['errors'][3])
+        self.assertFalse(Product.objects.exists())
+
+    def test_reorder_product(self):
+        """
+        Ensure the products are reordered by a list of ids in one update, in the ranks they take.
+        """
+        url = reverse('catalog:product-reorder')
+        first, second, third = [ProductFactory.create(ordering=rank) for rank in (10, 20, 30)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={'ids': [third.id, first.id]}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reordered'], 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [third.id, second.id, first.id])
+
+        # More ids than one batch are written with one update per batch.
+        with mock.patch.object(ordering, 'BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={'ids': [first.id, second.id, third.id]}, format='json',
+                                        **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reordered'], 3)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [first.id, second.id, third.id])
+
+        response = self.client.post(url, data={'ids': [first.id, 0]}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, data={'ids': [first.id], 'id': first.id}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_move_product(self):
+        """
+        Ensure a product moved before or after another one updates that product only, until the gap is used up.
+        """
+        url = reverse('catalog:product-reorder')
+        first, second, third = [ProductFactory.create(ordering=rank * ordering.GAP) for rank in (1, 2, 3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={'id': third.id, 'before': second.id}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [first.id, third.id, second.id])
+
+        response = self.client.post(url, data={'id': first.id, 'after': second.id}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [third.id, second.id, first.id])
+
+        # Without a gap between the neighbours, the ranks are spread again.
+        Product.objects.filter(pk=third.pk).update(ordering=Product.objects.get(pk=second.pk).ordering - 1)
+        response = self.client.post(url, data={'id': first.id, 'before': second.id}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [third.id, first.id, second.id])
+
+        response = self.client.post(url, data={'id': first.id, 'before': first.id}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_product(self):
+        """
+        Ensure the facets count the products of the list filters with one grouped query by facet, cached until a write.
+        """
+        url = reverse('catalog:product-facets')
+        category, other = CategoryFactory.create_batch(2)
+        ProductFactory.create_batch(2, brand='Acme', is_active=True, categories=[category, other])
+        ProductFactory.create(brand='Zeta', is_active=False, categories=[category])
+        category_table.get_rows()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.data['brand'], [{'value': 'Acme', 'count': 2}, {'value': 'Zeta', 'count': 1}])
+        self.assertEqual(response.data['categories'], [
+            {'value': category.id, 'title': category.title, 'count': 3},
+            {'value': other.id, 'title': other.title, 'count': 2},
+        ])
+        self.assertEqual(response.data['is_active'], [{'value': True, 'count': 2}, {'value': False, 'count': 1}])
+
+        response = self.client.get(url, data={'categories': other.id, 'facets': 'brand'})
+        self.assertEqual(response.data, {'brand': [{'value': 'Acme', 'count': 2}]})
+        response = self.client.get(url, data={'categories': other.id, 'facets': 'brand'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        ProductFactory.create(brand='Acme', categories=[other])
+        response = self.client.get(url, data={'categories': other.id, 'facets': 'brand'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data, {'brand': [{'value': 'Acme', 'count': 3}]})
+
+        response = self.client.get(url, data={'q': 'zeta', 'facets': 'brand,is_active'})
+        self.assertEqual(response.data, {
+            'brand': [{'value': 'Zeta', 'count': 1}],
+            'is_active': [{'value': False, 'count': 1}],
+        })
+        response = self.client.get(url, data={'facets': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch.object(changes, 'LAG', 0)
+    @mock.patch.object(changes, 'PAGE_SIZE', 2)
+    def test_changes_product(self):
+        """
+        Ensure the change feed pages the changed products in order and serves the deleted ids.
+        """
+        url = reverse('catalog:product-changes')
+        instances = ProductFactory.create_batch(3, categories=CategoryFactory.create_batch(1))
+
+        response = self.client.get(url, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [instance.id for instance in instances[:2]])
+        self.assertEqual(len(response.data['results'][0]['categories']), 1)
+        self.assertTrue(response.data['has_more'])
+
+        cursor = response.data['next']
+        response = self.client.get(url, data={'cursor': cursor}, **self.headers)
+        self.assertEqual([item['id'] for item in response.data['results']], [instances[2].id])
+        self.assertFalse(response.data['has_more'])
+
+        cursor = response.data['next']
+        deleted_id = instances[1].id
+        instances[0].title = 'Changed'
+        instances[0].save()
+        instances[1].delete()
+        response = self.client.get(url, data={'cursor': cursor}, **self.headers)
+        self.assertEqual([item['title'] for item in response.data['results']], ['Changed'])
+        self.assertEqual(response.data['deleted'], [deleted_id])
+
+        response = self.client.get(url, data={'updated_since': '2000-01-01T00:00:00Z'}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        response = self.client.get(url, data={'updated_since': '2000-01-01T00:00:00'}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        since = (timezone.now() - timedelta(minutes=1)).replace(tzinfo=None).isoformat()
+        response = self.client.get(url, data={'updated_since': since}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        # The cursor of an empty page of `updated_since` is followed like any other.
+        response = self.client.get(url, data={'updated_since': timezone.now().isoformat()}, **self.headers)
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get(url, data={'cursor': response.data['next']}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get(url, data={'cursor': 'invalid'}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete_product(self):
+        """
+        Ensure we can delete a batch of products in one request.
+        """
+        url = reverse('catalog:product-bulk')
+        categories = CategoryFactory.create_batch(2)
+        instances = ProductFactory.create_batch(30, is_active=True, categories=categories)
+        ids = [instance.id for instance in instances[:-1]]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(url, data={'ids': ids}, format='json', **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 29)
+        self.assertLessEqual(len(queries), 10)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [instances[-1].id])
+        self.assertEqual(sorted(Tombstone.objects.values_list('object_id', flat=True)), ids)
+        self.assertEqual(list(Category.objects.values_list('product_count', flat=True)), [1, 1])
+        self.assertEqual(search.search(Product.objects.all(), instances[0].title).count(), 0)
+
+        with mock.patch.object(ProductViewSet, 'bulk_max_items', 2):
+            response = self.client.delete(url, data={'ids': [1, 2, 3]}, format='json', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_product(self):
+        """
+        Ensure we can stream every product with its categories as NDJSON and CSV.
+        """
+        url = reverse('catalog:product-export')
+        categories = CategoryFactory.create_batch(2)
+        instances = ProductFactory.create_batch(3, categories=categories)
+
+        response = self.client.get(url, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [instance.id for instance in instances])
+        self.assertEqual(len(rows[0]['categories']), 2)
+
+        response = self.client.get(url, data={'output': 'csv', 'compress': 'gzip'}, **self.headers)
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows], [instance.id for instance in instances])
+        self.assertEqual(rows[0]['categories'], '|'.join(sorted(category.slug for category in categories)))
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        patcher = mock.patch.object(autocomplete, 'index', autocomplete.Autocomplete())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_autocomplete(self):
+        """
+        Ensure the titles, brands and categories are matched by the prefix of any word, without queries once loaded.
+        """
+        url = reverse('catalog:autocomplete')
+        category = CategoryFactory.create(title='Running Shoes')
+        runner = ProductFactory.create(title='Red Runner', brand='Rúnner Co', is_active=True, categories=[category])
+        ProductFactory.create(title='Blue Runner', brand='Rúnner Co', is_active=True)
+        ProductFactory.create(title='Green Runner', brand='Other', is_active=False)
+
+        response = self.client.get(url, data={'q': 'runn'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in response.data['products']], ['Red Runner', 'Blue Runner'])
+        self.assertEqual(response.data['brands'], ['Rúnner Co'])
+        self.assertEqual([item['id'] for item in response.data['categories']], [category.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data={'q': 'RED R', 'limit': 1})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.data['products'], [{'id': runner.id, 'title': 'Red Runner', 'slug': runner.slug,
+                                                      'brand': 'Rúnner Co'}])
+
+        runner.title = 'Red Racer'
+        runner.save()
+        Product.objects.get(title='Blue Runner').delete()
+        response = self.client.get(url, data={'q': 'r'})
+        self.assertEqual([item['title'] for item in response.data['products']], ['Red Racer'])
+        self.assertEqual(response.data['brands'], ['Rúnner Co'])
+        response = self.client.get(url, data={'q': 'runn'})
+        self.assertEqual(response.data['products'], [])
+
+        response = self.client.get(url, data={'q': 'r', 'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
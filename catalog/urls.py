@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ProductViewSet, CategoryViewSet
+from .views import AutocompleteView, ProductViewSet, CategoryViewSet
 
 app_name = 'catalog'
 
@@ -15,6 +15,10 @@ category_detail = CategoryViewSet.as_view({
     'delete': 'destroy'
 })
 
+category_changes = CategoryViewSet.as_view({
+    'get': 'changes',
+})
+
 product_list = ProductViewSet.as_view({
     'get': 'list',
     'post': 'create',
@@ -27,9 +31,41 @@ product_detail = ProductViewSet.as_view({
     'delete': 'destroy'
 })
 
+product_bulk = ProductViewSet.as_view({
+    'post': 'bulk',
+    'delete': 'bulk_destroy',
+})
+
+product_reorder = ProductViewSet.as_view({
+    'post': 'reorder',
+})
+
+product_export = ProductViewSet.as_view({
+    'get': 'export',
+})
+
+product_changes = ProductViewSet.as_view({
+    'get': 'changes',
+})
+
+product_facets = ProductViewSet.as_view({
+    'get': 'facets',
+})
+
 urlpatterns = [
+    path('autocomplete', AutocompleteView.as_view(), name='autocomplete'),
     path('categories', category_list, name='category-list'),
     path('categories/<int:pk>', category_detail, name='category-detail'),
+    path('categories/changes', category_changes, name='category-changes'),
     path('products', product_list, name='product-list'),
     path('products/<int:pk>', product_detail, name='product-detail'),
+    path('products/bulk', product_bulk, name='product-bulk'),
+    path('products/export', product_export, name='product-export'),
+    path('products/reorder', product_reorder, name='product-reorder'),
+    path('products/changes', product_changes, name='product-changes'),
+    path('products/facets', product_facets, name='product-facets'),
+    # The slug routes are after the fixed ones, whose words are the `reserved_slugs` of the models,
+    # and the slugs of only digits, taken as the pk, are reserved too.
+    path('categories/<slug:slug>', category_detail, name='category-detail-slug'),
+    path('products/<slug:slug>', product_detail, name='product-detail-slug'),
 ]
@@ -1,16 +1,78 @@
 import logging
+from django.http import StreamingHttpResponse
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductWriteSerializer
+from .models import Category, Product, category_slugs, product_slugs
+from django.utils.translation import gettext_lazy as _
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductWriteSerializer,
+    ProductBulkItemSerializer, ProductBulkDeleteSerializer, ProductReorderSerializer,
+)
+from . import autocomplete, bulk, changes, export, facets, ordering
+from .filters import ProductFilter, ProductSearchFilter
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
+from django_filters.rest_framework import DjangoFilterBackend
+from base.mixins import (
+    CachedResponseMixin, CompiledSerializerMixin, ConditionalGetMixin, QueryBudgetMixin, ReplicaReadMixin,
+    SlugLookupMixin, SparseFieldsetMixin,
+)
+from base.pagination import CachedCount, EstimatedCount
+from base.serializers import compile_serializer
 
 logger = logging.getLogger('catalog.views')
 
 
-class CategoryViewSet(ModelViewSet):
+def get_changes_response(view, request):
+    """
+    Return the response of the change feed of the model of the view after the `cursor`,
+    or after the `updated_since` datetime.
+    """
+    model = view.queryset.model
+    cursor = request.query_params.get('cursor')
+    updated_since = request.query_params.get('updated_since')
+    try:
+        if cursor:
+            position = changes.decode_cursor(cursor)
+        elif updated_since:
+            updated_since = parse_datetime(updated_since)
+            if updated_since is None:
+                raise changes.InvalidCursor()
+            if timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since, timezone.utc)
+            position = (updated_since, None)
+        else:
+            position = None
+    except (changes.InvalidCursor, ValueError):
+        return Response(data={'detail': _('Invalid cursor or updated_since.')}, status=status.HTTP_400_BAD_REQUEST)
+
+    logger.info('Starting changes %s with params: %s user id: %s',
+                model._meta.verbose_name_plural.title(), request.query_params.dict(), request.user.id)
+    compiled = compile_serializer(view.get_serializer_class())
+    queryset = model.objects.all()
+    try:
+        rows, deleted, position, has_more = changes.get_changes(queryset, compiled.columns, position)
+    except changes.ExpiredCursor:
+        return Response(data={'detail': _('The cursor has expired, sync from the start.')},
+                        status=status.HTTP_410_GONE)
+
+    logger.info('Response changes %s with status code: %s changed: %s deleted: %s user id: %s',
+                model._meta.verbose_name_plural.title(), status.HTTP_200_OK, len(rows), len(deleted), request.user.id)
+    return Response(data={
+        'results': compiled.render(rows, using=queryset.db),
+        'deleted': deleted,
+        'next': changes.encode_cursor(position) if position is not None else None,
+        'has_more': has_more,
+    })
+
+
+class CategoryViewSet(ReplicaReadMixin, QueryBudgetMixin, SlugLookupMixin, ConditionalGetMixin, CachedResponseMixin,
+                      CompiledSerializerMixin, SparseFieldsetMixin, ModelViewSet):
     """
     A viewset for viewing and editing catalog category instances.
 
@@ -34,6 +96,12 @@ class CategoryViewSet(ModelViewSet):
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cursor_ordering = ('title', 'id')
+    cache_models = (Category,)
+    slug_resolver = category_slugs
+    primary_actions = ('changes',)
+    count_strategy = CachedCount()
+    query_budget = {'list': 3, 'retrieve': 2}
 
     def get_permissions(self):
         """
@@ -46,57 +114,58 @@ class CategoryViewSet(ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def list(self, request, *args, **kwargs):
-        logger.info('Starting list {} with params: {}'.format(
-            Category._meta.verbose_name_plural.title(), request.query_params.dict())
-        )
+        logger.info('Starting list %s with params: %s',
+                    Category._meta.verbose_name_plural.title(), request.query_params.dict())
         response = super().list(request, *args, **kwargs)
-        logger.info('Response list {} with status code: {} params: {} response: {}'.format(
-            Category._meta.verbose_name_plural.title(), response.status_code, request.query_params.dict(), response.data
-        ))
+        logger.info(
+            'Response list %s with status code: %s params: %s',
+            Category._meta.verbose_name_plural.title(), response.status_code, request.query_params.dict()
+        )
         return response
 
     def create(self, request, *args, **kwargs):
-        logger.info('Starting create a {} with payload: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), request.data, request.user.id)
-        )
+        logger.info('Starting create a %s user id: %s', Category._meta.verbose_name.title(), request.user.id)
         response = super().create(request, *args, **kwargs)
-        logger.info('Response create a {} with status code: {} response: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), response.status_code, response.data, request.user.id
-        ))
+        logger.info('Response create a %s with status code: %s user id: %s',
+                    Category._meta.verbose_name.title(), response.status_code, request.user.id)
         return response
 
     def retrieve(self, request, *args, **kwargs):
-        logger.info('Starting retrieve a {} with pk: {}'.format(Category._meta.verbose_name.title(), kwargs['pk']))
+        logger.info('Starting retrieve a %s with pk: %s', Category._meta.verbose_name.title(), kwargs['pk'])
         response = super().retrieve(request, *args, **kwargs)
-        logger.info('Response retrieve a {} with pk: {} status code: {} response: {}'.format(
-            Category._meta.verbose_name.title(), kwargs['pk'], response.status_code, response.data
-        ))
+        logger.info('Response retrieve a %s with pk: %s status code: %s',
+                    Category._meta.verbose_name.title(), kwargs['pk'], response.status_code)
         return response
 
     def update(self, request, *args, **kwargs):
         action = 'partial update' if kwargs.get('partial', False) else 'update'
-        logger.info('Starting {} a {} with pk: {} payload: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), action, kwargs['pk'], request.data, request.user.id
-        ))
+        logger.info('Starting %s a %s with pk: %s user id: %s',
+                    action, Category._meta.verbose_name.title(), kwargs['pk'], request.user.id)
         response = super().update(request, *args, **kwargs)
-        logger.info('Response {} a {} with pk: {} status code: {} response: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), action, kwargs['pk'],
-            response.status_code, response.data, request.user.id
-        ))
+        logger.info(
+            'Response %s a %s with pk: %s status code: %s user id: %s',
+            action, Category._meta.verbose_name.title(), kwargs['pk'], response.status_code, request.user.id
+        )
         return response
 
     def destroy(self, request, *args, **kwargs):
-        logger.info('Starting destroy a {} with pk: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), kwargs['pk'], request.user.id)
-        )
+        logger.info('Starting destroy a %s with pk: %s user id: %s',
+                    Category._meta.verbose_name.title(), kwargs['pk'], request.user.id)
         response = super().destroy(request, *args, **kwargs)
-        logger.info('Response destroy a {} with pk: {} status code: {} user id: {}'.format(
-            Category._meta.verbose_name.title(), kwargs['pk'], response.status_code, request.user.id
-        ))
+        logger.info('Response destroy a %s with pk: %s status code: %s user id: %s',
+                    Category._meta.verbose_name.title(), kwargs['pk'], response.status_code, request.user.id)
         return response
 
+    @swagger_auto_schema(responses={200: 'Changed categories, deleted ids and the next cursor'})
+    def changes(self, request, *args, **kwargs):
+        """
+        Return the categories changed and deleted after the `cursor`, or the `updated_since` datetime.
+        """
+        return get_changes_response(self, request)
+
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, QueryBudgetMixin, SlugLookupMixin, ConditionalGetMixin, CachedResponseMixin,
+                     CompiledSerializerMixin, SparseFieldsetMixin, ModelViewSet):
     """
     A viewset for viewing and editing catalog product instances.
 
@@ -120,6 +189,25 @@ class ProductViewSet(ModelViewSet):
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    cache_models = (Product, Category)
+    slug_resolver = product_slugs
+    primary_actions = ('changes',)
+    cache_actions = ('list', 'retrieve', 'facets')
+    count_strategy = EstimatedCount(threshold=50000, fallback=CachedCount())
+    # The categories are not prefetched, the list and the detail render them from the `category_table`
+    # of the worker with one query on the through table, so the budgets hold for any number of categories.
+    query_budget = {'list': 5, 'retrieve': 4, 'facets': 4}
+    bulk_max_items = 5000
+
+    @property
+    def cursor_ordering(self):
+        # The search results are ordered by relevance, so they are paginated by page number.
+        request = getattr(self, 'request', None)
+        if request is not None and ProductSearchFilter().get_search_query(request):
+            return None
+        return ('ordering', 'id')
 
     def perform_create(self, serializer):
         return serializer.save()
@@ -131,70 +219,222 @@ class ProductViewSet(ModelViewSet):
         """
         Instantiates and returns the list of permissions that this view requires.
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
     def list(self, request, *args, **kwargs):
-        logger.info('Starting list {} with params: {}'.format(
-            Product._meta.verbose_name_plural.title(), request.query_params.dict())
-        )
+        logger.info('Starting list %s with params: %s',
+                    Product._meta.verbose_name_plural.title(), request.query_params.dict())
         response = super().list(request, *args, **kwargs)
-        logger.info('Response list {} with status code: {} params: {} response: {}'.format(
-            Product._meta.verbose_name_plural.title(), response.status_code, request.query_params.dict(), response.data
-        ))
+        logger.info(
+            'Response list %s with status code: %s params: %s',
+            Product._meta.verbose_name_plural.title(), response.status_code, request.query_params.dict()
+        )
         return response
 
     @swagger_auto_schema(request_body=ProductWriteSerializer, responses={201: ProductSerializer})
     def create(self, request, *args, **kwargs):
-        logger.info('Starting create a {} with payload: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), request.data, request.user.id)
-        )
+        logger.info('Starting create a %s user id: %s', Product._meta.verbose_name.title(), request.user.id)
         serializer_write = ProductWriteSerializer(data=request.data)
         serializer_write.is_valid(raise_exception=True)
         instance = self.perform_create(serializer_write)
         serializer = ProductSerializer(instance)
         headers = self.get_success_headers(serializer_write.data)
 
-        logger.info('Response create a {} with status code: {} response: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), status.HTTP_201_CREATED, serializer.data, request.user.id
-        ))
+        logger.info('Response create a %s with status code: %s user id: %s',
+                    Product._meta.verbose_name.title(), status.HTTP_201_CREATED, request.user.id)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def retrieve(self, request, *args, **kwargs):
-        logger.info('Starting retrieve a {} with pk: {}'.format(Product._meta.verbose_name.title(), kwargs['pk']))
+        logger.info('Starting retrieve a %s with pk: %s', Product._meta.verbose_name.title(), kwargs['pk'])
         response = super().retrieve(request, *args, **kwargs)
-        logger.info('Response retrieve a {} with pk: {} status code: {} response: {}'.format(
-            Product._meta.verbose_name.title(), kwargs['pk'], response.status_code, response.data
-        ))
+        logger.info('Response retrieve a %s with pk: %s status code: %s',
+                    Product._meta.verbose_name.title(), kwargs['pk'], response.status_code)
         return response
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         action = 'partial update' if partial else 'update'
-        logger.info('Starting {} a {} with pk: {} payload: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), action, kwargs['pk'], request.data, request.user.id
-        ))
+        logger.info('Starting %s a %s with pk: %s user id: %s',
+                    action, Product._meta.verbose_name.title(), kwargs['pk'], request.user.id)
         instance = self.get_object()
         serializer_write = ProductWriteSerializer(instance, data=request.data, partial=partial)
         serializer_write.is_valid(raise_exception=True)
         instance = self.perform_update(serializer_write)
         serializer = ProductSerializer(instance)
 
-        logger.info('Response {} a {} with pk: {} status code: {} response: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), action, kwargs['pk'], status.HTTP_200_OK, serializer.data,
-            request.user.id
-        ))
+        logger.info(
+            'Response %s a %s with pk: %s status code: %s user id: %s',
+            action, Product._meta.verbose_name.title(), kwargs['pk'], status.HTTP_200_OK, request.user.id
+        )
         return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
-        logger.info('Starting destroy a {} with pk: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), kwargs['pk'], request.user.id)
-        )
+        logger.info('Starting destroy a %s with pk: %s user id: %s',
+                    Product._meta.verbose_name.title(), kwargs['pk'], request.user.id)
         response = super().destroy(request, *args, **kwargs)
-        logger.info('Response destroy a {} with pk: {} status code: {} user id: {}'.format(
-            Product._meta.verbose_name.title(), kwargs['pk'], response.status_code, request.user.id
-        ))
+        logger.info('Response destroy a %s with pk: %s status code: %s user id: %s',
+                    Product._meta.verbose_name.title(), kwargs['pk'], response.status_code, request.user.id)
+        return response
+
+    @swagger_auto_schema(request_body=ProductBulkItemSerializer(many=True), responses={200: 'Created and updated ids'})
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create, or update the items with `id`, a batch of products in one transaction.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response(data={'detail': _('Expected a non empty list of items.')},
+                            status=status.HTTP_400_BAD_REQUEST)
+        logger.info('Starting bulk write %s with %s items user id: %s',
+                    Product._meta.verbose_name_plural.title(), len(request.data), request.user.id)
+        if len(request.data) > self.bulk_max_items:
+            return Response(data={'detail': _('Ensure this list has no more than {max} items.').format(
+                max=self.bulk_max_items
+            )}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created, updated = bulk.write_products(bulk.validate_products(request.data))
+        except bulk.BulkValidationError as e:
+            logger.info(
+                'Response bulk write %s with status code: %s errors: %s user id: %s',
+                Product._meta.verbose_name_plural.title(), status.HTTP_400_BAD_REQUEST, len(e.errors), request.user.id
+            )
+            return Response(data={'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            logger.info(
+                'Response bulk write %s with status code: %s user id: %s',
+                Product._meta.verbose_name_plural.title(), status.HTTP_409_CONFLICT, request.user.id
+            )
+            return Response(data={'detail': _('The batch conflicts with a concurrent write, try again.')},
+                            status=status.HTTP_409_CONFLICT)
+
+        logger.info(
+            'Response bulk write %s with status code: %s created: %s updated: %s user id: %s',
+            Product._meta.verbose_name_plural.title(), status.HTTP_200_OK, len(created), len(updated), request.user.id
+        )
+        return Response(data={'created': created, 'updated': updated})
+
+    @swagger_auto_schema(request_body=ProductBulkDeleteSerializer, responses={200: 'Number of deleted products'})
+    def bulk_destroy(self, request, *args, **kwargs):
+        """
+        Delete a batch of products in one transaction.
+        """
+        serializer = ProductBulkDeleteSerializer(data=request.data, context={'max_items': self.bulk_max_items})
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        logger.info('Starting bulk destroy %s with %s ids user id: %s',
+                    Product._meta.verbose_name_plural.title(), len(ids), request.user.id)
+        deleted = bulk.delete_products(ids)
+        logger.info('Response bulk destroy %s with status code: %s deleted: %s user id: %s',
+                    Product._meta.verbose_name_plural.title(), status.HTTP_200_OK, deleted, request.user.id)
+        return Response(data={'deleted': deleted})
+
+    @swagger_auto_schema(request_body=ProductReorderSerializer, responses={200: 'Number of reordered products'})
+    def reorder(self, request, *args, **kwargs):
+        """
+        Reorder the products given by `ids` in their order, or move the product `id` before or after another one.
+        """
+        serializer = ProductReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if len(data.get('ids', ())) > self.bulk_max_items:
+            return Response(data={'detail': _('Ensure this list has no more than {max} items.').format(
+                max=self.bulk_max_items
+            )}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info('Starting reorder %s user id: %s', Product._meta.verbose_name_plural.title(), request.user.id)
+        try:
+            if 'ids' in data:
+                reordered = ordering.reorder_products(data['ids'])
+            else:
+                ordering.move_product(data['id'], before=data.get('before'), after=data.get('after'))
+                reordered = 1
+        except Product.DoesNotExist:
+            return Response(data={'detail': _('Some of the products do not exist.')},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info('Response reorder %s with status code: %s reordered: %s user id: %s',
+                    Product._meta.verbose_name_plural.title(), status.HTTP_200_OK, reordered, request.user.id)
+        return Response(data={'reordered': reordered})
+
+    @swagger_auto_schema(responses={200: 'Counts of the brands, categories and states'})
+    def facets(self, request, *args, **kwargs):
+        """
+        Return the number of products of each brand, category and state among the products of the list filters,
+        optionally only the comma separated `facets`.
+        """
+        if 'facets' not in self.cache_actions:
+            return self.get_facets_response(request, *args, **kwargs)
+        return self.cached_response(self.get_facets_response, request, *args, **kwargs)
+
+    def get_facets_response(self, request, *args, **kwargs):
+        names = [name for name in request.query_params.get('facets', '').split(',') if name] or facets.FACETS
+        if set(names) - set(facets.FACETS):
+            return Response(data={'detail': _('Unknown facets, options: {options}.').format(
+                options=', '.join(facets.FACETS)
+            )}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info('Starting facets %s with params: %s',
+                    Product._meta.verbose_name_plural.title(), request.query_params.dict())
+        data = facets.get_facets(self.filter_queryset(self.get_queryset()), facets=names)
+        logger.info('Response facets %s with status code: %s params: %s',
+                    Product._meta.verbose_name_plural.title(), status.HTTP_200_OK, request.query_params.dict())
+        return Response(data=data)
+
+    @swagger_auto_schema(responses={200: 'Changed products, deleted ids and the next cursor'})
+    def changes(self, request, *args, **kwargs):
+        """
+        Return the products changed and deleted after the `cursor`, or the `updated_since` datetime.
+
+        A product is changed by its own fields and by its category links, the changes of the
+        categories themselves are in the change feed of the categories.
+        """
+        return get_changes_response(self, request)
+
+    @swagger_auto_schema(auto_schema=None)
+    def export(self, request, *args, **kwargs):
+        """
+        Stream every product, with its categories, as NDJSON or CSV optionally gzipped.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        compress = request.query_params.get('compress') == 'gzip'
+        if output not in export.FORMATS:
+            return Response(data={'detail': _('Unknown output, options: {options}.').format(
+                options=', '.join(export.FORMATS)
+            )}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info('Starting export %s with params: %s user id: %s',
+                    Product._meta.verbose_name_plural.title(), request.query_params.dict(), request.user.id)
+        queryset = self.filter_queryset(Product.objects.all())
+        filename = 'products.{}'.format(output)
+        response = StreamingHttpResponse(
+            export.export_products(output, compress=compress, queryset=queryset),
+            content_type='application/gzip' if compress else export.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}{}"'.format(filename, '.gz' if compress else '')
         return response
+
+
+class AutocompleteView(APIView):
+    """
+    Return the products, brands and categories with a word starting with the `q` text,
+    from the prefix index of the worker, see `catalog.autocomplete`.
+    """
+    # A public read served without queries, the token of the client is not looked up.
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', autocomplete.LIMIT)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(data={'detail': _('Ensure the limit is a number between 1 and {max}.').format(
+                max=self.max_limit
+            )}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data=autocomplete.index.suggest(request.query_params.get('q', ''), limit=limit))
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from base.asgi import FastPathApplication  # noqa: E402
+
+# The cached responses of the catalog are sent without a thread, see `base.asgi`.
+application = FastPathApplication(django_application)
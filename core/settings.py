@@ -62,6 +62,7 @@ THIRD_PARTY_APPS = [
     'rest_framework.authtoken',
     'drf_yasg',
     'oauth2_provider',
+    'django_filters',
 ]
 
 LOCAL_APPS = [
@@ -74,6 +75,9 @@ LOCAL_APPS = [
 INSTALLED_APPS = DEFAULT_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'base.middleware.RequestLogMiddleware',
+    'base.middleware.RenderedResponseMiddleware',
+    'base.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -115,6 +119,37 @@ DATABASES = {
     }
 }
 
+# The replicas of the default database, with the same engine, eg: `DATABASE_REPLICA_NAMES='replica.sqlite3'`.
+# The safe reads of the views with the `ReplicaReadMixin` go to a healthy replica, the reads of the
+# models written in the last `REPLICA_STICKY_SECONDS` go to the primary, a failed replica is skipped
+# for `REPLICA_COOLDOWN_SECONDS`.
+REPLICA_DATABASES = []
+for index, name in enumerate(os.environ.get('DATABASE_REPLICA_NAMES', '').split(), start=1):
+    REPLICA_DATABASES.append('replica{}'.format(index))
+    DATABASES[REPLICA_DATABASES[-1]] = dict(DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['base.db.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_COOLDOWN_SECONDS = int(os.environ.get('REPLICA_COOLDOWN_SECONDS', 30))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Share the cache between the workers in production (eg: memcached), the cache
+# versions of the models are used to invalidate the cached counts and responses.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_DEFAULT_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_DEFAULT_LOCATION', ''),
+    }
+}
+
+# The seconds a per-worker copy, see `base.cache.LocalTable` and `SlugResolver`, is kept without
+# reloading. The copies are invalidated by versions in the cache, which are not shared between
+# the workers with the default `LocMemCache`, so the copies of the other workers expire by age.
+LOCAL_CACHE_MAX_AGE = int(os.environ.get('LOCAL_CACHE_MAX_AGE', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -189,17 +224,28 @@ REST_FRAMEWORK = {
     'TEST_REQUEST_RENDERER_CLASSES': (
         'rest_framework.renderers.MultiPartRenderer',
         'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.TemplateHTMLRenderer'
+        'rest_framework.renderers.TemplateHTMLRenderer',
+        'base.renderers.MessagePackRenderer',
     ),
+    # The first renderer is the default, MessagePack is rendered only when it is requested.
+    'DEFAULT_RENDERER_CLASSES': [
+        'base.renderers.ORJSONRenderer',
+        'base.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     # Parser classes priority-wise for Swagger
     'DEFAULT_PARSER_CLASSES': [
+        'base.parsers.ORJSONParser',
+        'base.parsers.MessagePackParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
-        'rest_framework.parsers.JSONParser',
     ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema'
 }
 
+# The fraction of requests, from 0 to 1, with the response body logged by the `RequestLogMiddleware`.
+REQUEST_LOG_BODY_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_BODY_SAMPLE_RATE', 0))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -215,7 +261,7 @@ LOGGING = {
     },
     'handlers': {
         'file': {
-            'class': 'logging.FileHandler',
+            '()': 'base.logging.BackgroundFileHandler',
             'filename': 'django.log',
             'formatter': 'simple',
         },
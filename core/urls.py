@@ -9,6 +9,7 @@ from drf_yasg import openapi
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.documentation import include_docs_urls
+from base.views import CacheMetricsView
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -35,6 +36,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     url(r'^catalog/', include('catalog.urls', namespace='catalog')),
     url(r'^account/', include('account.urls', namespace='account')),
+    url(r'^metrics/cache$', CacheMetricsView.as_view(), name='cache-metrics'),
     url(r'^api-auth/', include('rest_framework.urls')),
     url(r'^oauth2/', include('oauth2_provider.urls', namespace='oauth2_provider')),
     url(r'^docs/', include_docs_urls(title=settings.APP_NAME, description=settings.APP_DESCRIPTION), name='docs-ui'),
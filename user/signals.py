@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from base.cache import mark_written
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def user_written(sender, **kwargs):
+    # The users and groups have no cache version, their reads from a replica follow the written flag only.
+    mark_written(sender)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_written(sender, action, **kwargs):
+    if action.startswith('post_'):
+        mark_written(Group)
@@ -4,9 +4,10 @@ from rest_framework import permissions
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from oauth2_provider.contrib.rest_framework import IsAuthenticatedOrTokenHasScope
+from base.mixins import ReplicaReadMixin
 
 
-class UserView(viewsets.ModelViewSet):
+class UserView(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing user instances.
 
@@ -47,7 +48,7 @@ class UserView(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class GroupView(viewsets.ModelViewSet):
+class GroupView(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing user group instances.
 